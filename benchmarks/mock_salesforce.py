@@ -0,0 +1,432 @@
+"""Local mock of the Salesforce REST endpoints the search tool uses.
+
+Serves /services/oauth2/token, /query (with nextRecordsUrl pagination),
+/composite/batch, Bulk API 2.0 query jobs (/jobs/query) and /limits for a
+synthetic org of numbered accounts and contacts. Latency, error rate, page
+size and volumes are configurable, so benchmarks run without credentials
+or network access:
+
+    python benchmarks/mock_salesforce.py --port 8765 --accounts 100000
+    SALESFORCE_LOGIN_URL=http://127.0.0.1:8765 python main.py --names "Benchmark Company 000001"
+
+Only the SOQL the tool sends is understood: SELECT ... FROM Account or
+Contact with a single Name / AccountId condition (=, IN or LIKE). LIKE
+'%term%' is matched as a case-insensitive prefix of the name so that
+lookups stay O(log n) on large orgs. Composite subrequests fail one at a
+time: an unsupported query or an injected error only fails its own entry.
+GET requests over the 16,384-byte URI limit are rejected with 414.
+Bulk query jobs export every Account, or every Contact with an AccountId,
+as CSV pages linked by Sforce-Locator, gzipped if the client accepts it.
+"""
+import argparse
+import bisect
+import csv
+import gzip
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from urllib.parse import parse_qs, urlparse
+
+API_VERSION = 'v60.0'
+API_PATH = f"/services/data/{API_VERSION}"
+ACCESS_TOKEN = 'mock-access-token'
+DEFAULT_PAGE_SIZE = 2000
+DAILY_API_LIMIT = 100000000
+COMPOSITE_BATCH_LIMIT = 25
+# Longest request URI Salesforce accepts, in bytes
+MAX_URI_LENGTH = 16384
+# Records per Bulk API result page unless the client asks for fewer
+BULK_RESULTS_PAGE_SIZE = 50000
+# Polls that still see a new job in progress
+BULK_JOB_POLLS_IN_PROGRESS = 1
+
+SOQL_PATTERN = re.compile(r"SELECT (.+?) FROM (Account|Contact) WHERE (Name|AccountId) (=|IN|LIKE) (.+)$", re.S)
+LITERAL_PATTERN = re.compile(r"'((?:[^'\\]|\\.)*)'")
+BULK_SOQL_PATTERN = re.compile(r"SELECT (.+?) FROM (Account|Contact)(?: WHERE AccountId != null)?$", re.S)
+
+def account_name(index):
+    # Six digits keep the names sorted for up to 1,000,000 accounts
+    return f"Benchmark Company {index:06d}"
+
+class MockOrg:
+    """Synthetic accounts and contacts, generated from their index on demand"""
+    
+    def __init__(self, accounts=10000, contacts_per_account=3):
+        self.accounts = accounts
+        self.contacts_per_account = contacts_per_account
+        # Lowercase names; the zero-padded numbers keep them sorted by index,
+        # so a name's position in this list is its account index
+        self._names = [account_name(i).casefold() for i in range(accounts)]
+    
+    def account(self, index):
+        return {
+            'attributes': {'type': 'Account'},
+            'Id': f"001{index:015d}",
+            'Name': account_name(index),
+            'BillingStreet': f"{index % 100 + 1}-1 Marunouchi",
+            'BillingCity': 'Chiyoda-ku',
+            'BillingState': 'Tokyo',
+            'BillingPostalCode': '100-0005',
+            'BillingCountry': 'Japan',
+            'Phone': '03-0000-0000',
+            'Website': f"https://company{index}.example.com",
+            'Description': 'Synthetic account served by the benchmark mock',
+            'Industry': 'Manufacturing',
+            'NumberOfEmployees': 10 + index % 5000
+        }
+    
+    def contacts(self, index):
+        # Every fifth account has no contacts, like many real orgs
+        count = 0 if index % 5 == 0 else self.contacts_per_account
+        return [{
+            'attributes': {'type': 'Contact'},
+            'Id': f"003{index:09d}{j:06d}",
+            'Name': f"Contact {index}-{j}",
+            'Title': 'Manager',
+            'Email': f"contact{j}@company{index}.example.com",
+            'Phone': '090-0000-0000',
+            'Department': 'Sales',
+            'AccountId': f"001{index:015d}"
+        } for j in range(count)]
+    
+    def find_exact(self, name):
+        name = name.casefold()
+        position = bisect.bisect_left(self._names, name)
+        return [position] if position < len(self._names) and self._names[position] == name else []
+    
+    def find_prefix(self, prefix, limit=2000):
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(self._names, prefix)
+        matches = []
+        for position in range(start, min(start + limit, len(self._names))):
+            if not self._names[position].startswith(prefix):
+                break
+            matches.append(position)
+        return matches
+    
+    def query(self, soql):
+        """Records for a SOQL query; raises ValueError for anything unsupported"""
+        match = SOQL_PATTERN.match(soql.strip())
+        if not match:
+            raise ValueError(f"unsupported query: {soql[:200]}")
+        fields, sobject, field, operator, value = match.groups()
+        values = [literal.replace("\\'", "'").replace('\\\\', '\\') for literal in LITERAL_PATTERN.findall(value)]
+        
+        if field == 'Name':
+            if operator == 'LIKE':
+                indexes = self.find_prefix(values[0].strip('%'))
+            else:
+                indexes = [index for name in values for index in self.find_exact(name)]
+        else:
+            indexes = [int(account_id[3:]) for account_id in values
+                       if account_id[3:].isdigit() and int(account_id[3:]) < self.accounts]
+        
+        if sobject == 'Account':
+            records = [self.account(index) for index in indexes]
+        else:
+            records = [contact for index in indexes for contact in self.contacts(index)]
+        
+        # Only return the selected fields, as Salesforce does
+        selected = ['attributes'] + [name.strip() for name in fields.split(',')]
+        return [{name: record.get(name) for name in selected} for record in records]
+    
+    def export(self, soql):
+        """Field names and a record iterator for a Bulk API query; raises ValueError for anything unsupported"""
+        match = BULK_SOQL_PATTERN.match(soql.strip())
+        if not match:
+            raise ValueError(f"unsupported query: {soql[:200]}")
+        fields, sobject = match.groups()
+        selected = [name.strip() for name in fields.split(',')]
+        
+        # Generated lazily so a full export doesn't sit in memory
+        if sobject == 'Account':
+            records = (self.account(index) for index in range(self.accounts))
+        else:
+            records = (contact for index in range(self.accounts) for contact in self.contacts(index))
+        return selected, ({name: record.get(name) for name in selected} for record in records)
+
+class MockSalesforceServer(ThreadingHTTPServer):
+    """HTTP server holding the org, cursors and failure settings"""
+    
+    daemon_threads = True
+    
+    def __init__(self, address, org, latency=0.0, jitter=0.0, error_rate=0.0, page_size=DEFAULT_PAGE_SIZE):
+        super().__init__(address, MockSalesforceHandler)
+        self.org = org
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.page_size = page_size
+        self.requests = 0
+        self.cursors = {}
+        self.jobs = {}
+        self.lock = threading.Lock()
+    
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+    
+    def page(self, records, page_size):
+        """First page of a result set, keeping the rest behind a nextRecordsUrl"""
+        result = {'totalSize': len(records), 'done': True, 'records': records[:page_size]}
+        if len(records) > page_size:
+            cursor = uuid.uuid4().hex
+            with self.lock:
+                self.cursors[cursor] = (records[page_size:], page_size, len(records))
+            result['done'] = False
+            result['nextRecordsUrl'] = f"{API_PATH}/query/{cursor}-{page_size}"
+        return result
+    
+    def next_page(self, cursor):
+        with self.lock:
+            records, page_size, total = self.cursors.pop(cursor)
+        result = self.page(records, page_size)
+        result['totalSize'] = total
+        return result
+
+class MockSalesforceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this every
+    # keep-alive response waits ~40 ms for a delayed ACK
+    disable_nagle_algorithm = True
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def send_json(self, status, body):
+        self.send_data(status, json.dumps(body).encode('utf-8'), 'application/json;charset=UTF-8')
+    
+    def send_data(self, status, data, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Sforce-Limit-Info', f"api-usage={self.server.requests}/{DAILY_API_LIMIT}")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def simulate_network(self):
+        """Apply the configured latency; returns True if this request should fail"""
+        with self.server.lock:
+            self.server.requests += 1
+        
+        delay = self.server.latency + random.uniform(0, self.server.jitter)
+        if delay:
+            time.sleep(delay)
+        
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self.send_json(500, [{'errorCode': 'UNKNOWN_EXCEPTION', 'message': 'Injected server error'}])
+            return True
+        return False
+    
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.simulate_network():
+            return
+        
+        if self.path.startswith('/services/oauth2/token'):
+            # The password grant must be form encoded, as on Salesforce
+            if not self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+                return self.send_json(400, {'error': 'invalid_request', 'error_description': 'unsupported content type'})
+            return self.send_json(200, {
+                'access_token': ACCESS_TOKEN,
+                'instance_url': self.server.url,
+                'token_type': 'Bearer',
+                'issued_at': str(int(time.time() * 1000))
+            })
+        if self.headers.get('Authorization') != f"Bearer {ACCESS_TOKEN}":
+            return self.send_json(401, [{'errorCode': 'INVALID_SESSION_ID', 'message': 'Session expired or invalid'}])
+        
+        path = urlparse(self.path).path.rstrip('/')
+        if path == f"{API_PATH}/composite/batch":
+            return self.composite_batch(json.loads(body))
+        if path == f"{API_PATH}/jobs/query":
+            return self.create_query_job(json.loads(body))
+        self.send_json(404, [{'errorCode': 'NOT_FOUND', 'message': self.path}])
+    
+    def create_query_job(self, request):
+        """Accept a Bulk API 2.0 query job; it completes after a few polls"""
+        try:
+            self.server.org.export(request.get('query', ''))
+        except ValueError as e:
+            return self.send_json(400, [{'errorCode': 'INVALIDJOB', 'message': str(e)}])
+        
+        job = {
+            'id': f"750{uuid.uuid4().int % 10 ** 15:015d}",
+            'operation': request.get('operation', 'query'),
+            'object': request['query'].split(' FROM ', 1)[1].split()[0],
+            'contentType': 'CSV',
+            'state': 'UploadComplete',
+            'query': request['query'],
+            'polls': 0
+        }
+        with self.server.lock:
+            self.server.jobs[job['id']] = job
+        self.send_json(200, self.job_info(job))
+    
+    def job_info(self, job):
+        return {name: value for name, value in job.items() if name not in ('query', 'polls')}
+    
+    def query_job(self, job_id, action, params):
+        job = self.server.jobs.get(job_id)
+        if job is None:
+            return self.send_json(404, [{'errorCode': 'NOT_FOUND', 'message': f"Job not found: {job_id}"}])
+        
+        if not action:
+            with self.server.lock:
+                job['polls'] += 1
+                job['state'] = 'InProgress' if job['polls'] <= BULK_JOB_POLLS_IN_PROGRESS else 'JobComplete'
+            return self.send_json(200, self.job_info(job))
+        if action != 'results':
+            return self.send_json(404, [{'errorCode': 'NOT_FOUND', 'message': self.path}])
+        if job['state'] != 'JobComplete':
+            return self.send_json(400, [{'errorCode': 'INVALIDJOBSTATE', 'message': f"Job is {job['state']}"}])
+        
+        # The locator is the offset of the next record
+        locator = params.get('locator', ['0'])[0]
+        page_size = params.get('maxRecords', [str(BULK_RESULTS_PAGE_SIZE)])[0]
+        if not locator.isdigit() or not page_size.isdigit() or int(page_size) == 0:
+            return self.send_json(400, [{'errorCode': 'INVALID_LOCATOR', 'message': locator}])
+        offset = int(locator)
+        page_size = min(int(page_size), BULK_RESULTS_PAGE_SIZE)
+        
+        fields, records = self.server.org.export(job['query'])
+        page = list(islice(records, offset, offset + page_size + 1))
+        more = len(page) > page_size
+        page = page[:page_size]
+        
+        # Bulk CSV quotes every value and leaves nulls empty
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator='\n')
+        writer.writerow(fields)
+        for record in page:
+            writer.writerow(['' if record[name] is None else record[name] for name in fields])
+        data = buffer.getvalue().encode('utf-8')
+        
+        headers = {
+            'Sforce-Locator': str(offset + page_size) if more else 'null',
+            'Sforce-NumberOfRecords': str(len(page))
+        }
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            data = gzip.compress(data)
+            headers['Content-Encoding'] = 'gzip'
+        self.send_data(200, data, 'text/csv', headers)
+    
+    def composite_batch(self, request):
+        """Answer every subrequest; a failed one doesn't fail the others"""
+        batch_requests = request.get('batchRequests', [])
+        if len(batch_requests) > COMPOSITE_BATCH_LIMIT:
+            return self.send_json(400, [{
+                'errorCode': 'INVALID_BATCH_REQUEST',
+                'message': f"A batch can contain at most {COMPOSITE_BATCH_LIMIT} subrequests"
+            }])
+        
+        results = []
+        for subrequest in batch_requests:
+            status, result = self.subrequest(subrequest)
+            results.append({'statusCode': status, 'result': result})
+        self.send_json(200, {
+            'hasErrors': any(result['statusCode'] != 200 for result in results),
+            'results': results
+        })
+    
+    def subrequest(self, subrequest):
+        # Subrequest URLs are relative to /services/data
+        url = urlparse(subrequest.get('url', ''))
+        path = url.path.rstrip('/')
+        if not path.startswith('/services/data/'):
+            path = f"/services/data/{path.lstrip('/')}"
+        if subrequest.get('method', 'GET') != 'GET' or path != f"{API_PATH}/query":
+            return 404, [{'errorCode': 'NOT_FOUND', 'message': subrequest.get('url')}]
+        
+        # Injected errors hit single subrequests too
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            return 500, [{'errorCode': 'UNKNOWN_EXCEPTION', 'message': 'Injected server error'}]
+        return self.query(parse_qs(url.query).get('q', [''])[0])
+    
+    def query(self, soql):
+        """Status and body of a query request"""
+        try:
+            records = self.server.org.query(soql)
+        except ValueError as e:
+            return 400, [{'errorCode': 'MALFORMED_QUERY', 'message': str(e)}]
+        return 200, self.server.page(records, self.page_size())
+    
+    def do_GET(self):
+        if self.simulate_network():
+            return
+        if len(self.path.encode('utf-8')) > MAX_URI_LENGTH:
+            return self.send_json(414, [{'errorCode': 'URI_TOO_LONG', 'message': f"{len(self.path)} bytes"}])
+        if self.headers.get('Authorization') != f"Bearer {ACCESS_TOKEN}":
+            return self.send_json(401, [{'errorCode': 'INVALID_SESSION_ID', 'message': 'Session expired or invalid'}])
+        
+        url = urlparse(self.path)
+        path = url.path.rstrip('/')
+        
+        if path == f"{API_PATH}/query":
+            return self.send_json(*self.query(parse_qs(url.query).get('q', [''])[0]))
+        
+        if path.startswith(f"{API_PATH}/query/"):
+            cursor = path.rsplit('/', 1)[1].split('-')[0]
+            try:
+                return self.send_json(200, self.server.next_page(cursor))
+            except KeyError:
+                return self.send_json(400, [{'errorCode': 'INVALID_QUERY_LOCATOR', 'message': cursor}])
+        
+        if path.startswith(f"{API_PATH}/jobs/query/"):
+            job_id, _, action = path[len(f"{API_PATH}/jobs/query/"):].partition('/')
+            return self.query_job(job_id, action, parse_qs(url.query))
+        
+        if path == f"{API_PATH}/limits":
+            return self.send_json(200, {'DailyApiRequests': {
+                'Max': DAILY_API_LIMIT,
+                'Remaining': DAILY_API_LIMIT - self.server.requests
+            }})
+        
+        self.send_json(404, [{'errorCode': 'NOT_FOUND', 'message': self.path}])
+    
+    def page_size(self):
+        # Honour "Sforce-Query-Options: batchSize=N" like Salesforce does
+        options = self.headers.get('Sforce-Query-Options', '')
+        for option in options.split(','):
+            name, _, value = option.strip().partition('=')
+            if name == 'batchSize' and value.isdigit():
+                return min(int(value), self.server.page_size)
+        return self.server.page_size
+
+def start_server(org, port=0, **options):
+    """Start a mock server on a background thread and return it"""
+    server = MockSalesforceServer(('127.0.0.1', port), org, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local mock Salesforce REST server for benchmarks")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--accounts', type=int, default=10000, help="Accounts in the synthetic org (default: 10000)")
+    parser.add_argument('--contacts-per-account', type=int, default=3, help="Contacts per account (default: 3)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every request (default: 0)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Extra random latency up to this many seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help="Records per query page")
+    args = parser.parse_args(argv)
+    
+    server = MockSalesforceServer(
+        ('127.0.0.1', args.port), MockOrg(args.accounts, args.contacts_per_account),
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, page_size=args.page_size
+    )
+    print(f"Mock Salesforce listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Peak memory of the search result rows on a synthetic contact fan-out.
+
+Builds the rows for N contacts spread over large accounts, keeps them all
+(as export_to_csv does) and then writes the contact CSV. Each row model
+runs in its own process so the peak RSS figures don't mix:
+
+    python benchmarks/row_memory.py --contacts 1000000
+"""
+import argparse
+import csv
+import os
+import resource
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import main
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (Linux reports KB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def synthetic_results(contacts, contacts_per_account):
+    """Accounts and their contacts shaped like the Salesforce query results"""
+    results = []
+    contacts_by_account = {}
+    for i in range(max(contacts // contacts_per_account, 1)):
+        account_id = f"001{i:015d}"
+        results.append({
+            'Id': account_id,
+            'Name': f"Synthetic Holdings {i}",
+            'BillingPostalCode': '100-0005',
+            'BillingCountry': 'Japan',
+            'BillingState': 'Tokyo',
+            'BillingCity': 'Chiyoda-ku',
+            'BillingStreet': f"1-{i} Marunouchi",
+            'Phone': '03-0000-0000',
+            'Website': f"https://example{i}.co.jp",
+            'Industry': 'Manufacturing',
+            'NumberOfEmployees': 5000 + i,
+            'Description': 'Synthetic account used for the row memory benchmark'
+        })
+        contacts_by_account[account_id] = [{
+            'Id': f"003{i:07d}{j:08d}",
+            'Name': f"Contact {i}-{j}",
+            'Title': 'Manager',
+            'Email': f"contact{i}.{j}@example{i}.co.jp",
+            'Phone': '090-0000-0000',
+            'Department': 'Sales'
+        } for j in range(contacts_per_account)]
+    return results, contacts_by_account
+
+def legacy_company_rows(results, company_name, contacts_by_account):
+    """The old row model: one flat dict per contact, account fields copied in"""
+    rows = []
+    for account in results:
+        account_data = {
+            'SearchKeyword': company_name,
+            'SFStatus': 'Found in Salesforce',
+            'AccountId': account['Id'],
+            'AccountName': account['Name'],
+            'AccountAddress': main.format_address(account),
+            'AccountPhone': account.get('Phone', ''),
+            'Website': account.get('Website', ''),
+            'Industry': account.get('Industry', ''),
+            'NumberOfEmployees': account.get('NumberOfEmployees', ''),
+            'Description': account.get('Description', '')
+        }
+        for contact in contacts_by_account.get(account['Id'], []):
+            contact_data = account_data.copy()
+            contact_data.update({
+                'ContactId': contact['Id'],
+                'ContactName': contact.get('Name', ''),
+                'ContactTitle': contact.get('Title', ''),
+                'ContactEmail': contact.get('Email', ''),
+                'ContactPhone': contact.get('Phone', ''),
+                'ContactDepartment': contact.get('Department', '')
+            })
+            rows.append(contact_data)
+    return rows
+
+# Old dict keys -> contact CSV columns, for writing the legacy rows
+LEGACY_CSV_COLUMNS = dict(zip(
+    ['SearchKeyword', 'SFStatus', 'AccountId', 'AccountName', 'AccountAddress',
+     'AccountPhone', 'Website', 'Industry', 'NumberOfEmployees', 'Description',
+     'ContactId', 'ContactName', 'ContactTitle', 'ContactEmail', 'ContactPhone',
+     'ContactDepartment'],
+    main.CONTACT_CSV_FIELDS
+))
+
+def run_model(model, contacts, contacts_per_account):
+    """Build and write every row with one row model; returns a result line"""
+    results, contacts_by_account = synthetic_results(contacts, contacts_per_account)
+    # Memory held by the synthetic input alone, the same for both models
+    baseline = peak_rss_mb()
+    
+    if model == 'dict':
+        rows = legacy_company_rows(results, "Synthetic", contacts_by_account)
+        built = peak_rss_mb()
+        with open(os.devnull, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=main.CONTACT_CSV_FIELDS)
+            for row in rows:
+                writer.writerow({LEGACY_CSV_COLUMNS[k]: v for k, v in row.items()})
+    else:
+        rows = main.build_company_rows(results, "Synthetic", contacts_by_account)
+        built = peak_rss_mb()
+        with open(os.devnull, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=main.CONTACT_CSV_FIELDS)
+            for row in rows:
+                writer.writerow(main.contact_csv_row(row))
+    
+    return (f"{model:<6} {len(rows):>10,} rows  input {baseline:8.1f} MB  "
+            f"rows {built - baseline:8.1f} MB  peak {peak_rss_mb():8.1f} MB")
+
+def main_benchmark(argv=None):
+    parser = argparse.ArgumentParser(description="Peak RSS of the old and new search result row models")
+    parser.add_argument('--contacts', type=int, default=1000000, help="Total contacts (default: 1000000)")
+    parser.add_argument('--contacts-per-account', type=int, default=2000, help="Contacts per account (default: 2000)")
+    parser.add_argument('--model', choices=['dict', 'slots'], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    
+    if args.model:
+        print(run_model(args.model, args.contacts, args.contacts_per_account))
+        return
+    
+    # Fresh interpreter per model so each peak is its own
+    for model in ('dict', 'slots'):
+        subprocess.run([
+            sys.executable, os.path.abspath(__file__), '--model', model,
+            '--contacts', str(args.contacts),
+            '--contacts-per-account', str(args.contacts_per_account)
+        ], check=True)
+
+if __name__ == "__main__":
+    main_benchmark()
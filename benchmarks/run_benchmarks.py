@@ -0,0 +1,175 @@
+"""End-to-end benchmarks of main.py against the local mock Salesforce server.
+
+Each run starts the mock (benchmarks/mock_salesforce.py), writes an input
+CSV of N company names and runs the tool on it in a fresh process:
+login, Account and Contact queries, console output and CSV export. It
+reports throughput, API latency percentiles, time per phase and peak
+memory:
+
+    python benchmarks/run_benchmarks.py                      # 100, 10k and 100k names
+    python benchmarks/run_benchmarks.py --sizes 100,10000 --latency 0.02 --error-rate 0.01
+    python benchmarks/run_benchmarks.py --json results.json
+    python benchmarks/run_benchmarks.py --compare results.json --tolerance 0.2
+
+With --compare the exit code is 1 when throughput drops or peak memory
+grows by more than the tolerance against a previous --json result, so
+regressions fail CI without any Salesforce credentials.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_salesforce import MockOrg, account_name, start_server
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+def write_names(path, count, accounts, miss_rate):
+    """Input CSV of unique names; about miss_rate of them match no account"""
+    miss_every = round(1 / miss_rate) if miss_rate else 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            if (miss_every and i % miss_every == miss_every - 1) or i >= accounts:
+                f.write(f"Missing Company {i}\n")
+            else:
+                f.write(f"{account_name(i)}\n")
+
+def run_case(server, size, args, work_dir):
+    """Run the tool on size names; returns a dict of results"""
+    case_dir = os.path.join(work_dir, str(size))
+    os.makedirs(case_dir, exist_ok=True)
+    names_path = os.path.join(case_dir, 'names.csv')
+    metrics_path = os.path.join(case_dir, 'metrics.json')
+    write_names(names_path, size, server.org.accounts, args.miss_rate)
+    
+    env = dict(
+        os.environ,
+        SALESFORCE_LOGIN_URL=server.url,
+        SALESFORCE_USERNAME='benchmark@example.com',
+        SALESFORCE_PASSWORD='benchmark',
+        SALESFORCE_CLIENT_ID='benchmark',
+        SALESFORCE_CLIENT_SECRET='benchmark'
+    )
+    command = [
+        sys.executable, MAIN_PATH, '--input', names_path, '--mode', args.mode,
+        '--output-dir', case_dir, '--concurrency', str(args.concurrency),
+        '--console', args.console, '--metrics-file', metrics_path
+    ] + args.extra
+    
+    # Console output goes to /dev/null but is still formatted and written
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=case_dir, env=env, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - started
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"main.py exited with {process.returncode} for {size} names")
+    
+    with open(metrics_path, encoding='utf-8') as f:
+        metrics = json.load(f)
+    endpoints = metrics['endpoints']
+    accounts = endpoints.get('query Account', {})
+    return {
+        'names': size,
+        'seconds': elapsed,
+        'names_per_second': size / elapsed,
+        'api_calls': sum(stats['calls'] for stats in endpoints.values()),
+        'retries': sum(stats['retries'] for stats in endpoints.values()),
+        'errors': sum(stats['errors'] for stats in endpoints.values()),
+        'account_p50_ms': accounts.get('p50', 0) * 1000,
+        'account_p95_ms': accounts.get('p95', 0) * 1000,
+        'account_p99_ms': accounts.get('p99', 0) * 1000,
+        'phases': metrics['phases'],
+        # ru_maxrss is in KB on Linux
+        'peak_rss_mb': usage.ru_maxrss / 1024
+    }
+
+def format_results(results):
+    lines = [
+        f"{'names':>8} {'seconds':>9} {'names/s':>9} {'calls':>8} {'retries':>7} {'errors':>6} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'display s':>9} {'export s':>9} {'peak MB':>8}"
+    ]
+    for result in results:
+        phases = result['phases']
+        lines.append(
+            f"{result['names']:>8} {result['seconds']:>9.2f} {result['names_per_second']:>9.1f} "
+            f"{result['api_calls']:>8} {result['retries']:>7} {result['errors']:>6} "
+            f"{result['account_p50_ms']:>8.1f} {result['account_p95_ms']:>8.1f} {result['account_p99_ms']:>8.1f} "
+            f"{phases.get('display', 0):>9.2f} {phases.get('export', 0):>9.2f} {result['peak_rss_mb']:>8.1f}"
+        )
+    return "\n".join(lines)
+
+def compare_results(results, baseline_path, tolerance):
+    """Regressions against a previous --json result, as messages"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {result['names']: result for result in json.load(f)['results']}
+    
+    regressions = []
+    for result in results:
+        previous = baseline.get(result['names'])
+        if previous is None:
+            continue
+        if result['names_per_second'] < previous['names_per_second'] * (1 - tolerance):
+            regressions.append(
+                f"{result['names']} names: throughput {result['names_per_second']:.1f} names/s "
+                f"(was {previous['names_per_second']:.1f})"
+            )
+        if result['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(
+                f"{result['names']} names: peak memory {result['peak_rss_mb']:.1f} MB "
+                f"(was {previous['peak_rss_mb']:.1f})"
+            )
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark main.py end to end against a local mock Salesforce")
+    parser.add_argument('--sizes', default='100,10000,100000', help="Comma-separated name counts (default: 100,10000,100000)")
+    parser.add_argument('--mode', choices=['partial', 'exact'], default='partial', help="Search mode (default: partial)")
+    parser.add_argument('--concurrency', type=int, default=8, help="--concurrency passed to main.py (default: 8)")
+    parser.add_argument('--console', default='verbose', help="--console passed to main.py (default: verbose)")
+    parser.add_argument('--accounts', type=int, default=100000, help="Accounts in the mock org (default: 100000)")
+    parser.add_argument('--contacts-per-account', type=int, default=3, help="Contacts per account (default: 3)")
+    parser.add_argument('--miss-rate', type=float, default=0.2, help="Fraction of names with no account (default: 0.2)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Mock latency per request in seconds (default: 0)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Extra random mock latency in seconds (default: 0)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests failing with a 500 (default: 0)")
+    parser.add_argument('--page-size', type=int, default=2000, help="Mock query page size (default: 2000)")
+    parser.add_argument('--json', metavar='PATH', help="Also write the results as JSON")
+    parser.add_argument('--compare', metavar='PATH', help="Fail if results regressed against this --json file")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed regression for --compare (default: 0.2)")
+    parser.add_argument('extra', nargs=argparse.REMAINDER, help="Further main.py options after --")
+    args = parser.parse_args(argv)
+    args.extra = [arg for arg in args.extra if arg != '--']
+    
+    server = start_server(
+        MockOrg(args.accounts, args.contacts_per_account),
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, page_size=args.page_size
+    )
+    
+    results = []
+    with tempfile.TemporaryDirectory(prefix='sf-benchmark-') as work_dir:
+        for size in [int(size) for size in args.sizes.split(',')]:
+            print(f"Running {size} names...", flush=True)
+            results.append(run_case(server, size, args, work_dir))
+    server.shutdown()
+    
+    print()
+    print(format_results(results))
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'settings': {k: v for k, v in vars(args).items() if k not in ('json', 'compare')},
+                       'results': results}, f, indent=2)
+    
+    if args.compare:
+        regressions = compare_results(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,260 +1,3157 @@
-import requests
+import time
+
+# When the script started loading, for the --timing breakdown
+STARTED = time.perf_counter()
+
 import json
 import os
 import csv
-from datetime import datetime
+import codecs
+from datetime import datetime, timedelta, timezone
 import unicodedata
 import sys
-import configparser
+import argparse
+import contextlib
+import random
+import threading
+import hashlib
+import sqlite3
+import gzip
+import shutil
+import importlib.util
+from array import array
+from collections import Counter, OrderedDict, deque
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from dotenv import load_dotenv
+from urllib.parse import quote_plus, urlencode
+
+# requests, python-dotenv, configparser and subprocess are imported where
+# they are used, so --help, option errors and --merge-shards don't load them
+
+# OAuth login host; SALESFORCE_LOGIN_URL overrides it (https://test.salesforce.com
+# for sandboxes, or a local mock server for benchmarks)
+DEFAULT_LOGIN_URL = 'https://login.salesforce.com'
+
+def get_salesforce_oauth_token(username, password, client_id, client_secret, session=None):
+    """Get Salesforce access token using OAuth2 password flow"""
+    
+    # OAuth2 token endpoint
+    login_url = os.environ.get('SALESFORCE_LOGIN_URL') or DEFAULT_LOGIN_URL
+    token_url = f"{login_url.rstrip('/')}/services/oauth2/token"
+    
+    # Request parameters
+    params = {
+        'grant_type': 'password',
+        'client_id': client_id,
+        'client_secret': client_secret,
+        'username': username,
+        'password': password
+    }
+    
+    # POST request to get token
+    import requests
+    api_scheduler.acquire()
+    started = time.perf_counter()
+    response = (session or requests).post(token_url, data=params)
+    run_metrics.record_call('auth', time.perf_counter() - started, response)
+    
+    if response.status_code == 200:
+        return response.json()
+    else:
+        run_metrics.count('auth', 'errors')
+        print(f"Authentication error: {response.status_code}")
+        print(response.text)
+        return None
+
+# Access tokens are kept on disk between runs. The password flow doesn't
+# say how long a session lasts; the org default is 2 hours, and a token
+# that expires sooner is replaced after the first 401
+TOKEN_CACHE_PATH = '.salesforce_token.json'
+TOKEN_MAX_AGE_MINUTES = 110
+
+class TokenCache:
+    """The last access token with its issue time, in a file only the owner can read"""
+    
+    def __init__(self, path=TOKEN_CACHE_PATH, max_age_minutes=TOKEN_MAX_AGE_MINUTES):
+        self.path = path
+        self.max_age = max_age_minutes * 60
+    
+    @staticmethod
+    def _key(credentials):
+        # Tokens belong to one user, connected app and login host
+        login_url = os.environ.get('SALESFORCE_LOGIN_URL') or DEFAULT_LOGIN_URL
+        identity = f"{login_url}\n{credentials['username']}\n{credentials['client_id']}"
+        return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+    
+    def load(self, credentials):
+        """The cached token response for these credentials, or None if missing or too old"""
+        try:
+            if os.name == 'posix' and os.stat(self.path).st_mode & 0o077:
+                print(f"Ignoring token cache readable by other users: {self.path}")
+                return None
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if entry.get('key') != self._key(credentials):
+            return None
+        if time.time() - entry.get('issued_at', 0) > self.max_age:
+            return None
+        return entry['auth_info']
+    
+    def save(self, credentials, auth_info):
+        """Store a token response; issued_at comes from Salesforce when it is given"""
+        issued_at = auth_info.get('issued_at')
+        entry = {
+            'key': self._key(credentials),
+            'issued_at': int(issued_at) / 1000 if str(issued_at).isdigit() else time.time(),
+            'auth_info': auth_info
+        }
+        
+        # Create the file with owner-only permissions before writing the
+        # token, then swap it in (each process uses its own temporary file)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Could not cache the access token: {e}")
+
+# REST API base path and SOQL query endpoint
+API_VERSION = 'v60.0'
+API_PATH = f"/services/data/{API_VERSION}"
+QUERY_PATH = f"{API_PATH}/query/"
+
+class AdaptiveBackoff:
+    """Shared backoff that slows every worker down when Salesforce pushes back"""
+    
+    def __init__(self, initial_delay=1.0, max_delay=60.0, max_retries=6):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.delay = 0.0
+        self.resume_at = 0.0
+        self._lock = threading.Lock()
+    
+    def wait(self):
+        """Sleep until the current backoff window has passed"""
+        with self._lock:
+            remaining = self.resume_at - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+    
+    def on_throttled(self):
+        """Double the delay and hold back all workers for that long"""
+        with self._lock:
+            self.delay = min(self.max_delay, max(self.initial_delay, self.delay * 2))
+            # Add jitter so workers don't retry in lockstep
+            delay = self.delay * random.uniform(0.5, 1.0)
+            self.resume_at = max(self.resume_at, time.monotonic() + delay)
+            return delay
+    
+    def on_success(self):
+        """Gradually recover the request rate after throttling stops"""
+        with self._lock:
+            if self.delay:
+                self.delay = self.delay / 2 if self.delay / 2 >= self.initial_delay else 0.0
+
+# Backoff state shared by all API calls
+api_backoff = AdaptiveBackoff()
+
+def is_throttled_response(response):
+    """Check if Salesforce is asking us to slow down"""
+    if response.status_code == 503:
+        return True
+    return response.status_code == 403 and 'REQUEST_LIMIT_EXCEEDED' in response.text
+
+def is_invalid_session_response(response):
+    """Check if the access token has expired or been revoked"""
+    return response.status_code == 401 and 'INVALID_SESSION_ID' in response.text
+
+# Daily API budget: percent of the org's allocation left for other
+# integrations, how long to wait for it to free up, and how often to
+# check /limits while waiting
+API_RESERVE_PERCENT = 10.0
+API_BUDGET_MAX_PAUSE = 3600
+API_BUDGET_POLL_INTERVAL = 60
+
+# Longest gap between requests when the budget nears the reserve
+API_SLOWDOWN_MAX_INTERVAL = 2.0
+
+class ApiBudgetExhausted(Exception):
+    """The org's remaining daily API requests reached the reserved floor"""
+
+class ApiLimitScheduler:
+    """Pace API requests and keep the org's daily API budget above a reserve"""
+    
+    def __init__(self, max_rate=None, reserve_percent=API_RESERVE_PERCENT, poll_interval=None,
+                 max_pause=API_BUDGET_MAX_PAUSE):
+        self.max_rate = max_rate
+        self.reserve_percent = reserve_percent
+        self.poll_interval = poll_interval
+        self.max_pause = max_pause
+        self.calls = 0
+        self.used = None
+        self.limit = None
+        self.first_used = None
+        self.exhausted = False
+        self._next_slot = 0.0
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+        self._pause_lock = threading.Lock()
+    
+    def configure(self, max_rate=None, reserve_percent=API_RESERVE_PERCENT, poll_interval=None):
+        """Apply the command line settings"""
+        self.max_rate = max_rate
+        self.reserve_percent = reserve_percent
+        self.poll_interval = poll_interval
+    
+    def remaining(self):
+        """Daily API requests the org has left, or None if not known yet"""
+        if self.limit is None:
+            return None
+        return self.limit - self.used
+    
+    def floor(self):
+        """Daily API requests that must be left untouched"""
+        return (self.limit or 0) * self.reserve_percent / 100
+    
+    def acquire(self, client=None):
+        """Wait for this request's turn; raises ApiBudgetExhausted at the reserve"""
+        if client is not None and self.poll_interval and time.monotonic() - self._last_poll >= self.poll_interval:
+            self.poll_limits(client)
+        
+        if self._at_floor():
+            self._pause(client)
+        
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval()
+            self.calls += 1
+        
+        if slot > now:
+            time.sleep(slot - now)
+    
+    def _at_floor(self):
+        remaining = self.remaining()
+        return remaining is not None and self.reserve_percent > 0 and remaining <= self.floor()
+    
+    def _interval(self):
+        interval = 1 / self.max_rate if self.max_rate else 0.0
+        
+        # Slow down gradually over the last reserve-sized stretch of budget
+        floor = self.floor()
+        remaining = self.remaining()
+        if remaining is not None and floor > 0 and remaining < 2 * floor:
+            interval = max(interval, API_SLOWDOWN_MAX_INTERVAL * min(1.0, (2 * floor - remaining) / floor))
+        return interval
+    
+    def _pause(self, client):
+        # One thread waits for the budget to recover; the others queue here
+        with self._pause_lock:
+            if self.exhausted:
+                raise ApiBudgetExhausted(self._exhausted_message())
+            if not self._at_floor():
+                return
+            
+            print(f"Daily API requests nearly used up ({self.remaining()} left, "
+                  f"{self.floor():.0f} reserved), pausing...")
+            deadline = time.monotonic() + self.max_pause
+            while client is not None and time.monotonic() < deadline:
+                time.sleep(min(API_BUDGET_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+                self.poll_limits(client)
+                if not self._at_floor():
+                    print("Daily API requests available again, resuming")
+                    return
+            
+            self.exhausted = True
+            raise ApiBudgetExhausted(self._exhausted_message())
+    
+    def _exhausted_message(self):
+        return (f"Stopped to keep {self.reserve_percent:g}% of the daily API requests in reserve "
+                f"({self.used}/{self.limit} used)")
+    
+    def observe(self, response):
+        """Record the org's API usage from a response's Sforce-Limit-Info header"""
+        # e.g. "api-usage=18/15000"
+        for part in response.headers.get('Sforce-Limit-Info', '').split(','):
+            name, _, value = part.strip().partition('=')
+            if name != 'api-usage':
+                continue
+            
+            used, _, limit = value.partition('/')
+            if used.isdigit() and limit.isdigit():
+                self._set_usage(int(used), int(limit))
+    
+    def poll_limits(self, client):
+        """Refresh the org's usage from the /limits resource"""
+        self._last_poll = time.monotonic()
+        with self._lock:
+            self.calls += 1
+        
+        # Straight through the session so a paused scheduler can still poll
+        started = time.perf_counter()
+        try:
+            response = client.session.get(client.url(f"{API_PATH}/limits"), timeout=client.timeout)
+        except client.connection_errors as e:
+            print(f"Could not check API limits: {e}")
+            return
+        
+        run_metrics.record_call('limits', time.perf_counter() - started, response)
+        if response.status_code != 200:
+            print(f"Could not check API limits: {response.status_code}")
+            return
+        
+        daily = response.json().get('DailyApiRequests', {})
+        if 'Max' in daily and 'Remaining' in daily:
+            self._set_usage(daily['Max'] - daily['Remaining'], daily['Max'])
+    
+    def _set_usage(self, used, limit):
+        with self._lock:
+            self.used = used
+            self.limit = limit
+            if self.first_used is None:
+                self.first_used = used
+    
+    def summary(self, names):
+        """API requests made, per 1000 names, and the org's daily usage"""
+        per_thousand = self.calls * 1000 / names if names else 0.0
+        lines = [f"API requests: {self.calls} ({per_thousand:.1f} per 1000 names)"]
+        if self.limit is not None:
+            lines.append(f"Org daily API usage: {self.used}/{self.limit} "
+                         f"({self.used - self.first_used:+d} since the first response)")
+        return "\n".join(lines)
+
+# Request scheduler shared by all API calls
+api_scheduler = ApiLimitScheduler()
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def endpoint_name(method, path, params=None):
+    """Short metrics label for an API call, e.g. 'query Account' or 'composite/batch'"""
+    path = path.split('?', 1)[0]
+    if path.startswith('http'):
+        path = '/' + path.split('/', 3)[-1]
+    if path.startswith(API_PATH):
+        path = path[len(API_PATH):]
+    parts = [part for part in path.split('/') if part]
+    
+    if not parts:
+        return method
+    if parts[0] == 'query':
+        if len(parts) > 1:
+            # nextRecordsUrl of an earlier query
+            return 'query more'
+        words = (params or {}).get('q', '').split()
+        keywords = [word.upper() for word in words]
+        if 'FROM' in keywords[:-1]:
+            return f"query {words[keywords.index('FROM') + 1]}"
+        return 'query'
+    if parts[0] == 'jobs':
+        return 'bulk results' if parts[-1] == 'results' else 'bulk job'
+    return '/'.join(parts[:2])
+
+class RunMetrics:
+    """API call latency, retries, errors and bytes per endpoint, and time per phase"""
+    
+    def __init__(self):
+        self._latencies = {}
+        self._counters = Counter()
+        self._phases = Counter()
+        self._lock = threading.Lock()
+    
+    def record_call(self, endpoint, seconds, response=None, streamed=False):
+        """Record one HTTP call (every attempt, including retried ones)"""
+        sent = received = 0
+        if response is not None:
+            body = response.request.body if response.request is not None else None
+            sent = len(body) if body else 0
+            # Wire size when known; streamed bodies are not read here
+            length = response.headers.get('Content-Length')
+            if length and length.isdigit():
+                received = int(length)
+            elif not streamed:
+                received = len(response.content)
+        
+        with self._lock:
+            self._latencies.setdefault(endpoint, []).append(seconds)
+            self._counters[endpoint, 'bytes_sent'] += sent
+            self._counters[endpoint, 'bytes_received'] += received
+    
+    def count(self, endpoint, kind):
+        """Count a retry or a failed call"""
+        with self._lock:
+            self._counters[endpoint, kind] += 1
+    
+    def add_time(self, phase, seconds):
+        """Add time spent in a phase of the run (search, display, export...)"""
+        with self._lock:
+            self._phases[phase] += seconds
+    
+    def lap(self, phase, started):
+        """Add the time since started to a phase; returns the current time"""
+        now = time.perf_counter()
+        self.add_time(phase, now - started)
+        return now
+    
+    def as_dict(self):
+        """All metrics as plain data, latencies in seconds"""
+        with self._lock:
+            endpoints = {}
+            for endpoint, latencies in sorted(self._latencies.items()):
+                latencies = sorted(latencies)
+                endpoints[endpoint] = {
+                    'calls': len(latencies),
+                    'retries': self._counters[endpoint, 'retries'],
+                    'errors': self._counters[endpoint, 'errors'],
+                    'bytes_sent': self._counters[endpoint, 'bytes_sent'],
+                    'bytes_received': self._counters[endpoint, 'bytes_received'],
+                    'seconds': sum(latencies),
+                    'p50': percentile(latencies, 0.5),
+                    'p95': percentile(latencies, 0.95),
+                    'p99': percentile(latencies, 0.99)
+                }
+            return {'endpoints': endpoints, 'phases': dict(self._phases)}
+    
+    def summary(self):
+        """Tables of API calls by endpoint and time by phase"""
+        data = self.as_dict()
+        lines = []
+        if data['endpoints']:
+            lines.append("API calls by endpoint:")
+            lines.append(f"  {'endpoint':<18} {'calls':>7} {'retries':>7} {'errors':>6} {'sent KB':>9} "
+                         f"{'recv KB':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+            for endpoint, stats in data['endpoints'].items():
+                lines.append(
+                    f"  {endpoint:<18} {stats['calls']:>7} {stats['retries']:>7} {stats['errors']:>6} "
+                    f"{stats['bytes_sent'] / 1024:>9.1f} {stats['bytes_received'] / 1024:>9.1f} "
+                    f"{stats['p50'] * 1000:>8.1f} {stats['p95'] * 1000:>8.1f} {stats['p99'] * 1000:>8.1f}"
+                )
+        if data['phases']:
+            lines.append("Time by phase:")
+            for phase, seconds in data['phases'].items():
+                lines.append(f"  {phase:<18} {seconds:>9.2f} s")
+        return "\n".join(lines)
+    
+    def prometheus(self):
+        """Metrics in the Prometheus text exposition format"""
+        data = self.as_dict()
+        lines = [
+            "# HELP salesforce_search_api_request_seconds Salesforce API call latency by endpoint",
+            "# TYPE salesforce_search_api_request_seconds summary"
+        ]
+        for endpoint, stats in data['endpoints'].items():
+            label = f'endpoint="{endpoint}"'
+            for quantile, key in (('0.5', 'p50'), ('0.95', 'p95'), ('0.99', 'p99')):
+                lines.append(f'salesforce_search_api_request_seconds{{{label},quantile="{quantile}"}} {stats[key]:.6f}')
+            lines.append(f"salesforce_search_api_request_seconds_sum{{{label}}} {stats['seconds']:.6f}")
+            lines.append(f"salesforce_search_api_request_seconds_count{{{label}}} {stats['calls']}")
+        
+        for kind in ('retries', 'errors', 'bytes_sent', 'bytes_received'):
+            lines.append(f"# TYPE salesforce_search_api_{kind}_total counter")
+            for endpoint, stats in data['endpoints'].items():
+                lines.append(f'salesforce_search_api_{kind}_total{{endpoint="{endpoint}"}} {stats[kind]}')
+        
+        lines.append("# TYPE salesforce_search_phase_seconds_total counter")
+        for phase, seconds in data['phases'].items():
+            lines.append(f'salesforce_search_phase_seconds_total{{phase="{phase}"}} {seconds:.6f}')
+        return "\n".join(lines) + "\n"
+    
+    def write(self, path):
+        """Dump the metrics as Prometheus text (.prom) or JSON (anything else)"""
+        content = self.prometheus() if path.endswith('.prom') else json.dumps(self.as_dict(), indent=2) + "\n"
+        
+        # Replace atomically so a textfile collector never reads a partial file
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+# Metrics for the whole run, printed at the end and optionally dumped to a file
+run_metrics = RunMetrics()
+
+class StartupTiming:
+    """Time from the script loading to each startup step, for --timing"""
+    
+    def __init__(self, started=STARTED):
+        self.started = started
+        self._marks = OrderedDict()
+    
+    def mark(self, step):
+        """Note that a step finished; only the first time counts"""
+        if step not in self._marks:
+            self._marks[step] = time.perf_counter()
+    
+    def summary(self):
+        lines = ["Startup timing (ms since the script started loading):"]
+        previous = self.started
+        for step, at in self._marks.items():
+            lines.append(f"  {step:<24} {(at - self.started) * 1000:>9.1f}  (+{(at - previous) * 1000:.1f})")
+            previous = at
+        return "\n".join(lines)
+
+startup_timing = StartupTiming()
+
+class SalesforceClient:
+    """Salesforce REST client with a pooled session, retries and token refresh"""
+    
+    # Status codes worth retrying (503 is handled by the shared backoff)
+    RETRY_STATUS_CODES = (500, 502, 504)
+    
+    # Set by login when the token came from the TokenCache
+    cached_token = False
+    
+    def __init__(self, auth_info, credentials=None, pool_size=10, max_retries=3, timeout=(10, 120),
+                 query_batch_size=None, token_cache=None):
+        import requests
+        self.credentials = credentials
+        self.query_batch_size = query_batch_size
+        self.token_cache = token_cache
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.connection_errors = (requests.ConnectionError, requests.Timeout)
+        self._auth_lock = threading.Lock()
+        
+        # One keep-alive pool per host, large enough for every worker thread
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max(pool_size, 10))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Content-Type'] = 'application/json'
+        
+        self._set_auth_info(auth_info)
+    
+    @classmethod
+    def login(cls, config, pool_size=10, query_batch_size=None, token_cache=None):
+        """Authenticate with the credentials from load_config and return a client"""
+        options = {'credentials': config, 'pool_size': pool_size,
+                   'query_batch_size': query_batch_size, 'token_cache': token_cache}
+        
+        # A cached token skips the login round trip; if it has been revoked
+        # the first request gets a 401 and the client logs in again
+        auth_info = token_cache.load(config) if token_cache else None
+        if auth_info:
+            client = cls(auth_info, **options)
+            client.cached_token = True
+            return client
+        
+        import requests
+        session = requests.Session()
+        auth_info = get_salesforce_oauth_token(
+            config['username'],
+            config['password'],
+            config['client_id'],
+            config['client_secret'],
+            session=session
+        )
+        session.close()
+        
+        if not auth_info:
+            return None
+        if token_cache:
+            token_cache.save(config, auth_info)
+        return cls(auth_info, **options)
+    
+    def _set_auth_info(self, auth_info):
+        self.auth_info = auth_info
+        self.instance_url = auth_info['instance_url']
+        self.session.headers['Authorization'] = f"Bearer {auth_info['access_token']}"
+    
+    def refresh_token(self, stale_token=None):
+        """Get a new access token, unless another thread already did"""
+        with self._auth_lock:
+            if stale_token and self.auth_info['access_token'] != stale_token:
+                return True
+            
+            if not self.credentials:
+                return False
+            
+            # Not self.session: its JSON Content-Type and stale Bearer token
+            # must not go to the login host with the form-encoded grant
+            import requests
+            print("Access token expired, re-authenticating...")
+            with requests.Session() as session:
+                auth_info = get_salesforce_oauth_token(
+                    self.credentials['username'],
+                    self.credentials['password'],
+                    self.credentials['client_id'],
+                    self.credentials['client_secret'],
+                    session=session
+                )
+            if not auth_info:
+                return False
+            
+            self._set_auth_info(auth_info)
+            if self.token_cache:
+                self.token_cache.save(self.credentials, auth_info)
+            return True
+    
+    def url(self, path):
+        """Build an absolute URL for an API path such as a nextRecordsUrl"""
+        if path.startswith('http'):
+            return path
+        return f"{self.instance_url}{path}"
+    
+    def request(self, method, path, **kwargs):
+        """Send a request, retrying transient errors and refreshing the token"""
+        url = self.url(path)
+        endpoint = endpoint_name(method, path, kwargs.get('params'))
+        kwargs.setdefault('timeout', self.timeout)
+        refreshed = False
+        attempt = 0
+        throttled = 0
+        
+        while True:
+            api_backoff.wait()
+            api_scheduler.acquire(self)
+            token = self.auth_info['access_token']
+            
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except self.connection_errors as e:
+                run_metrics.record_call(endpoint, time.perf_counter() - started)
+                if attempt >= self.max_retries:
+                    run_metrics.count(endpoint, 'errors')
+                    raise
+                run_metrics.count(endpoint, 'retries')
+                attempt += 1
+                delay = self._retry_delay(attempt)
+                print(f"Connection error ({e}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                continue
+            
+            run_metrics.record_call(endpoint, time.perf_counter() - started, response, kwargs.get('stream', False))
+            api_scheduler.observe(response)
+            
+            if is_invalid_session_response(response) and not refreshed:
+                refreshed = True
+                if self.refresh_token(token):
+                    run_metrics.count(endpoint, 'retries')
+                    continue
+                run_metrics.count(endpoint, 'errors')
+                return response
+            
+            if is_throttled_response(response):
+                if throttled >= api_backoff.max_retries:
+                    run_metrics.count(endpoint, 'errors')
+                    return response
+                run_metrics.count(endpoint, 'retries')
+                throttled += 1
+                delay = api_backoff.on_throttled()
+                print(f"Salesforce is throttling requests ({response.status_code}), retrying in {delay:.1f}s...")
+                continue
+            
+            if response.status_code in self.RETRY_STATUS_CODES and attempt < self.max_retries:
+                run_metrics.count(endpoint, 'retries')
+                attempt += 1
+                delay = self._retry_delay(attempt)
+                print(f"Server error ({response.status_code}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                continue
+            
+            api_backoff.on_success()
+            if response.status_code >= 400:
+                run_metrics.count(endpoint, 'errors')
+            return response
+    
+    def _retry_delay(self, attempt):
+        # Exponential backoff with full jitter
+        return random.uniform(0, 0.5 * (2 ** attempt))
+    
+    def get(self, path, params=None, **kwargs):
+        """GET request against the instance"""
+        return self.request('GET', path, params=params, **kwargs)
+    
+    def post(self, path, **kwargs):
+        """POST request against the instance"""
+        return self.request('POST', path, **kwargs)
+
+# Clients created for plain token dicts, keyed by access token
+_clients_for_tokens = {}
+_clients_lock = threading.Lock()
+
+def get_client(auth_info):
+    """Get a SalesforceClient for either a client or a plain auth_info dict"""
+    if isinstance(auth_info, SalesforceClient):
+        return auth_info
+    
+    with _clients_lock:
+        client = _clients_for_tokens.get(auth_info['access_token'])
+        if client is None:
+            client = SalesforceClient(auth_info)
+            _clients_for_tokens[auth_info['access_token']] = client
+        return client
+
+def to_half_width(text):
+    """Convert full-width characters to half-width"""
+    return unicodedata.normalize('NFKC', text)
+
+# Bytes read from the start of an input CSV to detect its encoding
+ENCODING_SNIFF_BYTES = 1024 * 1024
+
+def detect_csv_encoding(file_path, sniff_bytes=ENCODING_SNIFF_BYTES):
+    """Guess a CSV file's encoding from its first bytes; returns None if unknown"""
+    with open(file_path, 'rb') as f:
+        prefix = f.read(sniff_bytes)
+    
+    if prefix.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if prefix.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    
+    # Excel on Japanese Windows saves as cp932 (a superset of shift_jis).
+    # A character cut in half at the end of the prefix is not an error.
+    for encoding in ['utf-8', 'cp932']:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(prefix, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+def count_csv_lines(file_path, chunk_size=ENCODING_SNIFF_BYTES):
+    """Count the lines of a file without decoding it; returns None if it can't be read"""
+    lines = 0
+    last = b'\n'
+    try:
+        with open(file_path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                lines += chunk.count(b'\n')
+                last = chunk[-1:]
+    except OSError:
+        return None
+    # The last line may not end with a newline
+    return lines + (last != b'\n')
+
+def read_company_names_from_csv(file_path, column=None):
+    """Stream unique company names from a CSV file; returns None if it can't be read"""
+    try:
+        encoding = detect_csv_encoding(file_path)
+    except OSError as e:
+        print(f"Error reading CSV file: {e}")
+        return None
+    
+    if encoding is None:
+        print(f"Could not read CSV file. Encoding might not be supported: {file_path}")
+        return None
+    
+    csvfile = open(file_path, 'r', newline='', encoding=encoding)
+    reader = csv.reader(csvfile)
+    column_index = 0
+    
+    if column:
+        # Header names are matched loosely (width and case don't matter)
+        header = [to_half_width(name).strip().casefold() for name in next(reader, [])]
+        wanted = to_half_width(column).strip().casefold()
+        if wanted not in header:
+            csvfile.close()
+            print(f"Column not found in CSV file: {column}")
+            return None
+        column_index = header.index(wanted)
+    
+    return _iter_csv_company_names(file_path, encoding, csvfile, reader, column_index)
+
+class InputFileError(Exception):
+    """The input CSV can't be read to the end"""
+
+def _iter_csv_company_names(file_path, encoding, csvfile, reader, column_index):
+    # Names are normalized to half-width and only yielded once, so
+    # duplicates in the input are never searched twice
+    seen = set()
+    lines_done = reader.line_num
+    while True:
+        with csvfile:
+            try:
+                for row in reader:
+                    if reader.line_num <= lines_done:
+                        continue
+                    lines_done = reader.line_num
+                    if len(row) <= column_index:
+                        continue
+                    
+                    company_name = to_half_width(row[column_index]).strip()
+                    if company_name and company_name not in seen:
+                        seen.add(company_name)
+                        yield company_name
+                return
+            except UnicodeDecodeError as e:
+                # Only the start of the file was sniffed: an ASCII prefix
+                # looks like utf-8 even if Excel saved the file as cp932
+                if encoding != 'utf-8':
+                    raise InputFileError(f"Error reading CSV file after line {lines_done}: {e}")
+                print(f"CSV file is not utf-8 after line {lines_done}, reading it as cp932")
+            except csv.Error as e:
+                raise InputFileError(f"Error reading CSV file after line {lines_done}: {e}")
+        
+        # Read again and skip the lines that were already read
+        encoding = 'cp932'
+        csvfile = open(file_path, 'r', newline='', encoding=encoding)
+        reader = csv.reader(csvfile)
+
+class SalesforceAPIError(Exception):
+    """Error response from the Salesforce REST API"""
+    
+    def __init__(self, status_code, text):
+        super().__init__(f"{status_code}: {text}")
+        self.status_code = status_code
+        self.text = text
+
+# Default page size hint for queries (Salesforce allows 200-2000)
+QUERY_BATCH_SIZE = 2000
+
+def iter_query_pages(auth_info, query, batch_size=None):
+    """Run a SOQL query, yielding one page of records at a time"""
+    client = get_client(auth_info)
+    headers = _query_headers(client, batch_size)
+    
+    response = client.get(QUERY_PATH, params={'q': query}, headers=headers)
+    yield from _iter_response_pages(client, response, headers)
+
+def iter_query_url_pages(auth_info, next_records_url, batch_size=None):
+    """Continue a query from a nextRecordsUrl, yielding one page at a time"""
+    client = get_client(auth_info)
+    headers = _query_headers(client, batch_size)
+    
+    response = client.get(next_records_url, headers=headers)
+    yield from _iter_response_pages(client, response, headers)
+
+def _query_headers(client, batch_size):
+    # Page size hint for the query endpoint
+    batch_size = batch_size or client.query_batch_size
+    if batch_size:
+        return {'Sforce-Query-Options': f"batchSize={batch_size}"}
+    return {}
+
+def _iter_response_pages(client, response, headers):
+    while True:
+        if response.status_code != 200:
+            raise SalesforceAPIError(response.status_code, response.text)
+        
+        data = response.json()
+        yield data['records']
+        
+        # Follow nextRecordsUrl until Salesforce reports the last page
+        if data.get('done', True) or not data.get('nextRecordsUrl'):
+            return
+        response = client.get(data['nextRecordsUrl'], headers=headers)
+
+def iter_query_records(auth_info, query, batch_size=None):
+    """Run a SOQL query, yielding records as each page arrives"""
+    for records in iter_query_pages(auth_info, query, batch_size):
+        yield from records
+
+# Default location and limits of the local query cache
+CACHE_PATH = '.salesforce_cache.sqlite3'
+CACHE_TTL_HOURS = 24 * 7
+CACHE_MAX_ENTRIES = 100000
+
+class QueryCache:
+    """On-disk query result cache with TTL and LRU eviction"""
+    
+    def __init__(self, path=CACHE_PATH, ttl_hours=CACHE_TTL_HOURS, max_entries=CACHE_MAX_ENTRIES, memo_size=1024):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self.max_entries = max_entries
+        self.memo_size = memo_size
+        self.hits = 0
+        self.memo_hits = 0
+        self.misses = 0
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        
+        # Worker threads share one connection, serialized by the lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used)")
+        
+        # Drop expired entries up front so the size limit only counts live ones
+        self._db.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.ttl,))
+        self._db.commit()
+        self._count = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+    
+    @staticmethod
+    def make_key(*parts):
+        """Build a cache key from JSON-serializable parts"""
+        return json.dumps(parts, ensure_ascii=False, separators=(',', ':'))
+    
+    def get(self, key):
+        """Return the cached value, or None on a miss"""
+        with self._lock:
+            # In-process memo first, so repeated names never touch the disk
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                self.memo_hits += 1
+                return self._memo[key]
+            
+            now = time.time()
+            row = self._db.execute(
+                "SELECT value, created FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            
+            if row is None or row[1] < now - self.ttl:
+                self.misses += 1
+                return None
+            
+            self._db.execute("UPDATE cache SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            value = json.loads(row[0])
+            self._remember(key, value)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries if full"""
+        with self._lock:
+            now = time.time()
+            existed = self._db.execute("SELECT 1 FROM cache WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            if not existed:
+                self._count += 1
+            
+            if self._count > self.max_entries:
+                overflow = self._count - self.max_entries
+                self._db.execute(
+                    "DELETE FROM cache WHERE key IN "
+                    "(SELECT key FROM cache ORDER BY last_used LIMIT ?)", (overflow,)
+                )
+                self._count -= overflow
+            
+            self._db.commit()
+            self._remember(key, value)
+    
+    def _remember(self, key, value):
+        self._memo[key] = value
+        self._memo.move_to_end(key)
+        if len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+    
+    def summary(self):
+        """One-line hit/miss report"""
+        lookups = self.hits + self.memo_hits + self.misses
+        rate = (self.hits + self.memo_hits) / lookups * 100 if lookups else 0
+        return (
+            f"Cache: {self.hits + self.memo_hits} hits "
+            f"({self.memo_hits} in memory), {self.misses} misses, {rate:.1f}% hit rate"
+        )
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Fields fetched for accounts and contacts unless configured otherwise
+DEFAULT_ACCOUNT_FIELDS = [
+    'Id', 'Name',
+    'BillingStreet', 'BillingCity', 'BillingState', 'BillingPostalCode', 'BillingCountry',
+    'Phone', 'Website', 'Description', 'Industry', 'NumberOfEmployees'
+]
+
+DEFAULT_CONTACT_FIELDS = ['Id', 'Name', 'Title', 'Email', 'Phone', 'Department']
+
+# Fields every projection keeps: record keys and the name searched on
+REQUIRED_FIELDS = {
+    'Account': ['Id', 'Name'],
+    'Contact': ['Id']
+}
+
+def parse_field_list(text):
+    """Split a comma-separated list of field API names"""
+    return [field.strip() for field in text.split(',') if field.strip()]
+
+class FieldProjection:
+    """Account and Contact fields to query; fields outside the defaults become extra export columns"""
+    
+    def __init__(self):
+        self.configure()
+    
+    def configure(self, account_fields=None, contact_fields=None):
+        """Use these field lists instead of the defaults (None keeps the default)"""
+        self.account = self._with_required('Account', account_fields or DEFAULT_ACCOUNT_FIELDS)
+        self.contact = self._with_required('Contact', contact_fields or DEFAULT_CONTACT_FIELDS)
+        self.account_extra = [field for field in self.account if field not in DEFAULT_ACCOUNT_FIELDS]
+        self.contact_extra = [field for field in self.contact if field not in DEFAULT_CONTACT_FIELDS]
+    
+    @staticmethod
+    def _with_required(sobject, fields):
+        return list(dict.fromkeys(REQUIRED_FIELDS[sobject] + list(fields)))
+    
+    @property
+    def is_default(self):
+        return self.account == DEFAULT_ACCOUNT_FIELDS and self.contact == DEFAULT_CONTACT_FIELDS
+    
+    def validate(self, auth_info, describe_cache):
+        """Check the fields against describe results; returns unknown 'Object.Field' names"""
+        unknown = []
+        fields = {'Account': self.account, 'Contact': self.contact}
+        
+        for sobject, names in fields.items():
+            # Salesforce field names are case-insensitive but records come
+            # back keyed by the described spelling, so adopt it
+            described = {name.casefold(): name for name in describe_cache.field_names(auth_info, sobject)}
+            for i, name in enumerate(names):
+                if name.casefold() in described:
+                    names[i] = described[name.casefold()]
+                else:
+                    unknown.append(f"{sobject}.{name}")
+        
+        self.configure(fields['Account'], fields['Contact'])
+        return unknown
+    
+    def as_dict(self):
+        return {'account_fields': self.account, 'contact_fields': self.contact}
+    
+    def company_csv_fields(self):
+        """Company file columns: the standard layout plus extra account fields"""
+        return COMPANY_CSV_FIELDS + self.account_extra
+    
+    def contact_csv_fields(self):
+        """Contact file columns: the standard layout plus extra account and contact fields"""
+        return CONTACT_CSV_FIELDS + self.account_extra + self.contact_extra_columns()
+    
+    def contact_extra_columns(self):
+        """Names of the extra contact fields in rows and files, kept apart from account fields"""
+        return [f"Contact {field}" for field in self.contact_extra]
+
+# The field projection used by every query of this run
+field_projection = FieldProjection()
+
+def extra_values(record, fields):
+    """Values of extra fields as export text (empty for missing or null)"""
+    values = []
+    for field in fields:
+        value = record.get(field)
+        values.append('' if value is None else str(value))
+    return tuple(values)
+
+# Describe results cached locally to validate configured fields
+DESCRIBE_CACHE_PATH = '.salesforce_describe.json'
+DESCRIBE_TTL_HOURS = 24
+
+class DescribeCache:
+    """Field names from sObject describe calls, kept in a JSON file for a TTL"""
+    
+    def __init__(self, path=DESCRIBE_CACHE_PATH, ttl_hours=DESCRIBE_TTL_HOURS):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+    
+    def field_names(self, auth_info, sobject):
+        """Field API names of an sObject, described at most once per TTL per org"""
+        client = get_client(auth_info)
+        key = f"{client.instance_url} {sobject}"
+        entry = self._entries.get(key)
+        if entry and time.time() - entry['fetched'] < self.ttl:
+            return entry['fields']
+        
+        response = client.get(f"{API_PATH}/sobjects/{sobject}/describe")
+        if response.status_code != 200:
+            raise SalesforceAPIError(response.status_code, response.text)
+        
+        fields = [field['name'] for field in response.json()['fields']]
+        now = time.time()
+        self._entries = {key: entry for key, entry in self._entries.items() if now - entry['fetched'] < self.ttl}
+        self._entries[key] = {'fetched': now, 'fields': fields}
+        
+        # Write a temporary file first so a crash can't leave half a cache
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f)
+        os.replace(temp_path, self.path)
+        return fields
+
+def soql_quote(value):
+    """Quote a string literal for SOQL, escaping backslashes and quotes"""
+    escaped = value.replace('\\', '\\\\').replace("'", "\\'")
+    return f"'{escaped}'"
+
+def build_account_query(company_name, search_mode="partial"):
+    """Build the Account SOQL query for a company name"""
+    # SOQL query - get company info and needed fields
+    # Change condition based on search mode
+    if search_mode == "exact":
+        where_clause = f"WHERE Name = {soql_quote(company_name)}"
+    else:
+        where_clause = f"WHERE Name LIKE {soql_quote(f'%{company_name}%')}"
+    
+    return f"SELECT {', '.join(field_projection.account)} FROM Account {where_clause}"
+
+def iter_company_accounts(auth_info, company_name, search_mode="partial", batch_size=None):
+    """Search for company information, yielding accounts as pages arrive"""
+    # Convert full-width to half-width characters
+    company_name = to_half_width(company_name)
+    
+    query = build_account_query(company_name, search_mode)
+    return iter_query_records(auth_info, query, batch_size)
+
+class LatencyStats:
+    """Per-backend time spent resolving each company name"""
+    
+    def __init__(self):
+        self._timings = {}
+        self._lock = threading.Lock()
+    
+    def record(self, backend, seconds, names=1):
+        """Record a lookup; batch lookups are spread evenly over their names"""
+        if names < 1:
+            return
+        with self._lock:
+            self._timings.setdefault(backend, []).extend([seconds / names] * names)
+    
+    def summary(self):
+        """Table comparing the backends used in this run"""
+        lines = []
+        with self._lock:
+            for backend, timings in sorted(self._timings.items()):
+                timings = sorted(timings)
+                average = sum(timings) / len(timings)
+                p50 = percentile(timings, 0.5)
+                p95 = percentile(timings, 0.95)
+                lines.append(
+                    f"  {backend:<10} {len(timings):>8} names  "
+                    f"avg {average * 1000:8.1f} ms  p50 {p50 * 1000:8.1f} ms  p95 {p95 * 1000:8.1f} ms"
+                )
+        return "\n".join(lines)
+
+# Lookup latency per search backend, printed at the end of a run
+backend_latency = LatencyStats()
+
+class LookupFailures:
+    """Lookups that failed after retries, counted for the run and tracked per batch"""
+    
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        self._batch = threading.local()
+    
+    def record(self, error=None, names=None):
+        """Note a failed lookup of these names (None: every name of the batch)"""
+        if getattr(self._batch, 'ignored', False):
+            return
+        
+        with self._lock:
+            self.count += 1
+        
+        failed = getattr(self._batch, 'names', None)
+        if failed is not None:
+            failed.update([None] if names is None else names)
+            self._batch.fatal = self._batch.fatal or self.is_fatal(error)
+    
+    @staticmethod
+    def is_fatal(error):
+        # Connection and authentication errors would fail every later lookup
+        # too; anything else (a malformed query, a rejected name) is per name
+        if isinstance(error, SalesforceAPIError):
+            return error.status_code in (401, 403)
+        return isinstance(error, OSError)
+    
+    @contextlib.contextmanager
+    def ignored(self):
+        """Don't record failures on this thread, e.g. for timing-only lookups"""
+        self._batch.ignored = True
+        try:
+            yield
+        finally:
+            self._batch.ignored = False
+    
+    def start_batch(self):
+        """Start tracking the lookups of one batch on this thread"""
+        self._batch.names = set()
+        self._batch.fatal = False
+    
+    def finish_batch(self, company_names):
+        """Stop tracking; returns the batch's failed names and whether the run must stop"""
+        failed, fatal = self._batch.names, self._batch.fatal
+        self._batch.names = None
+        return (set(company_names) if None in failed else failed), fatal
+
+class SearchFailed(Exception):
+    """A connection or authentication error stopped the search"""
+
+# Failed lookups of this run, so it can exit with an error
+lookup_failures = LookupFailures()
+
+def search_company(auth_info, company_name, search_mode="partial", cache=None):
+    """Search for company information (partial or exact match)"""
+    if not auth_info:
+        return False, []
+    
+    if cache:
+        cache_key = cache.make_key('Account', to_half_width(company_name), search_mode, field_projection.account)
+        results = cache.get(cache_key)
+        if results is not None:
+            return len(results) > 0, results
+    
+    # Fetch every page of matching accounts
+    try:
+        started = time.perf_counter()
+        results = list(iter_company_accounts(auth_info, company_name, search_mode))
+        backend_latency.record('soql', time.perf_counter() - started)
+        
+        # Only successful lookups are cached, never errors
+        if cache:
+            cache.put(cache_key, results)
+        return len(results) > 0, results
+    except SalesforceAPIError as e:
+        lookup_failures.record(e)
+        print(f"API call error: {e.status_code}")
+        print(e.text)
+        return False, []
+    except ApiBudgetExhausted:
+        # Not a lookup error: stop the run so it can continue with --resume
+        raise
+    except Exception as e:
+        lookup_failures.record(e)
+        print(f"Error: {e}")
+        return False, []
+
+# Characters with special meaning in a SOSL search term
+SOSL_RESERVED_CHARS = set('?&|!{}[]()^~*:\\"\'+-')
+
+def sosl_escape(term):
+    """Escape reserved characters in a SOSL search term"""
+    return ''.join(f"\\{char}" if char in SOSL_RESERVED_CHARS else char for char in term)
+
+def search_company_sosl(auth_info, company_name, cache=None):
+    """Search for a company through the SOSL search index"""
+    if not auth_info:
+        return False, []
+    
+    company_name = to_half_width(company_name)
+    
+    if cache:
+        cache_key = cache.make_key('AccountSOSL', company_name, field_projection.account)
+        results = cache.get(cache_key)
+        if results is not None:
+            return len(results) > 0, results
+    
+    # SOSL matches words in the name; the trailing * also matches prefixes
+    search = (
+        f"FIND {{{sosl_escape(company_name)}*}} IN NAME FIELDS "
+        f"RETURNING Account({', '.join(field_projection.account)}) LIMIT 2000"
+    )
+    
+    try:
+        started = time.perf_counter()
+        response = get_client(auth_info).get(f"{API_PATH}/search/", params={'q': search})
+        if response.status_code != 200:
+            raise SalesforceAPIError(response.status_code, response.text)
+        
+        # Same record dicts as the SOQL query returns
+        results = response.json()['searchRecords']
+        backend_latency.record('sosl', time.perf_counter() - started)
+        
+        if cache:
+            cache.put(cache_key, results)
+        return len(results) > 0, results
+    except SalesforceAPIError as e:
+        lookup_failures.record(e)
+        print(f"Search API call error: {e.status_code}")
+        print(e.text)
+        return False, []
+    except ApiBudgetExhausted:
+        raise
+    except Exception as e:
+        lookup_failures.record(e)
+        print(f"Error: {e}")
+        return False, []
+
+def get_contacts(auth_info, account_id):
+    """Get contacts related to an account"""
+    if not auth_info:
+        return []
+    
+    # SOQL query for contacts
+    query = f"SELECT {', '.join(field_projection.contact)} FROM Contact WHERE AccountId = '{account_id}'"
+    
+    try:
+        return list(iter_query_records(auth_info, query))
+    except SalesforceAPIError as e:
+        lookup_failures.record(e)
+        print(f"Contact API call error: {e.status_code}")
+        print(e.text)
+        return []
+    except ApiBudgetExhausted:
+        raise
+    except Exception as e:
+        lookup_failures.record(e)
+        print(f"Contact info retrieval error: {e}")
+        return []
+
+# Keep each "IN (...)" list well below the 16,384-byte URI limit of the
+# REST API, leaving room for the rest of the query. Measured URL-encoded:
+# an Id character takes 1 byte there, a Japanese character 9
+SOQL_IN_CLAUSE_MAX_BYTES = 12000
+
+def chunk_in_values(values, max_bytes=SOQL_IN_CLAUSE_MAX_BYTES):
+    """Split quoted SOQL literals into chunks that fit in one IN (...) clause"""
+    chunk = []
+    chunk_len = 0
+
+    for value in values:
+        # Encoded as in the query string, plus the separating comma (%2C)
+        value_len = len(quote_plus(value)) + 3
+        if chunk and chunk_len + value_len > max_bytes:
+            yield chunk
+            chunk = []
+            chunk_len = 0
+        chunk.append(value)
+        chunk_len += value_len
+
+    if chunk:
+        yield chunk
+
+def get_contacts_bulk(auth_info, account_ids, cache=None):
+    """Get contacts for many accounts at once, grouped by account ID"""
+    # Every requested account gets an entry, even if it has no contacts
+    contacts_by_account = {account_id: [] for account_id in account_ids}
+
+    if not auth_info or not contacts_by_account:
+        return contacts_by_account
+
+    # Only query accounts whose contacts aren't cached
+    missing_ids = list(contacts_by_account)
+    if cache:
+        missing_ids = []
+        for account_id in contacts_by_account:
+            contacts = cache.get(cache.make_key('Contact', account_id, field_projection.contact))
+            if contacts is None:
+                missing_ids.append(account_id)
+            else:
+                contacts_by_account[account_id] = contacts
+
+    quoted_ids = [f"'{account_id}'" for account_id in missing_ids]
+
+    for chunk in chunk_in_values(quoted_ids):
+        # SOQL query for contacts of every account in this chunk
+        query = (
+            f"SELECT {', '.join(field_projection.contact)}, AccountId "
+            "FROM Contact "
+            f"WHERE AccountId IN ({','.join(chunk)})"
+        )
+
+        try:
+            # A chunk of accounts can easily span several pages of contacts
+            for contact in iter_query_records(auth_info, query):
+                contacts_by_account.setdefault(contact['AccountId'], []).append(contact)
+            
+            if cache:
+                for quoted_id in chunk:
+                    account_id = quoted_id.strip("'")
+                    cache.put(cache.make_key('Contact', account_id, field_projection.contact), contacts_by_account[account_id])
+        except SalesforceAPIError as e:
+            lookup_failures.record(e)
+            print(f"Contact API call error: {e.status_code}")
+            print(e.text)
+        except ApiBudgetExhausted:
+            raise
+        except Exception as e:
+            lookup_failures.record(e)
+            print(f"Contact info retrieval error: {e}")
+
+    return contacts_by_account
+
+def fetch_company(auth_info, company_name, search_mode="partial", cache=None, backend='soql'):
+    """Search for a company and fetch the contacts of every account found"""
+    if backend == 'sosl' and search_mode == "partial":
+        exists, results = search_company_sosl(auth_info, company_name, cache)
+    else:
+        exists, results = search_company(auth_info, company_name, search_mode, cache)
+    contacts_by_account = get_contacts_bulk(auth_info, [account['Id'] for account in results], cache)
+    return results, contacts_by_account
+
+# Names resolved per exact-match batch (split further to fit IN clauses)
+EXACT_BATCH_SIZE = 500
+
+def fetch_companies_exact(auth_info, company_names, cache=None):
+    """Exact-match many companies with Name IN (...) queries"""
+    # Salesforce compares names case-insensitively, so group the same way
+    match_keys = [to_half_width(company_name).casefold() for company_name in company_names]
+    results_by_key = {}
+    
+    # Names answered by the cache don't need to be queried
+    cache_keys = {}
+    names_to_query = {}
+    for company_name, match_key in zip(company_names, match_keys):
+        if match_key in results_by_key or match_key in names_to_query:
+            continue
+        
+        normalized_name = to_half_width(company_name)
+        if cache:
+            cache_keys[match_key] = cache.make_key('Account', normalized_name, 'exact', field_projection.account)
+            cached = cache.get(cache_keys[match_key])
+            if cached is not None:
+                results_by_key[match_key] = cached
+                continue
+        names_to_query[match_key] = normalized_name
+    
+    quoted_names = {soql_quote(name): match_key for match_key, name in names_to_query.items()}
+    
+    for chunk in chunk_in_values(list(quoted_names)):
+        query = f"SELECT {', '.join(field_projection.account)} FROM Account WHERE Name IN ({','.join(chunk)})"
+        
+        chunk_results = {quoted_names[quoted_name]: [] for quoted_name in chunk}
+        chunk_names = [company_name for company_name, match_key in zip(company_names, match_keys) if match_key in chunk_results]
+        try:
+            started = time.perf_counter()
+            for account in iter_query_records(auth_info, query):
+                match_key = account['Name'].casefold()
+                if match_key in chunk_results:
+                    chunk_results[match_key].append(account)
+            backend_latency.record('soql-in', time.perf_counter() - started, len(chunk))
+        except SalesforceAPIError as e:
+            lookup_failures.record(e, chunk_names)
+            print(f"API call error: {e.status_code}")
+            print(e.text)
+            continue
+        except ApiBudgetExhausted:
+            raise
+        except Exception as e:
+            lookup_failures.record(e, chunk_names)
+            print(f"Error: {e}")
+            continue
+        
+        results_by_key.update(chunk_results)
+        if cache:
+            for match_key, results in chunk_results.items():
+                cache.put(cache_keys[match_key], results)
+    
+    # One contact lookup for every account found in the whole batch
+    all_account_ids = [account['Id'] for results in results_by_key.values() for account in results]
+    contacts_by_account = get_contacts_bulk(auth_info, all_account_ids, cache)
+    
+    fetched = []
+    for company_name, match_key in zip(company_names, match_keys):
+        # Names that failed or matched nothing get the "Not found" rows
+        results = results_by_key.get(match_key, [])
+        fetched.append((
+            company_name,
+            results,
+            {account['Id']: contacts_by_account.get(account['Id'], []) for account in results}
+        ))
+    return fetched
+
+# Salesforce accepts at most 25 subrequests per composite batch
+COMPOSITE_BATCH_SIZE = 25
+
+def fetch_companies_composite(auth_info, company_names, search_mode="partial", cache=None):
+    """Search for up to 25 companies in one Composite Batch API request"""
+    client = get_client(auth_info)
+    results_by_index = {}
+    
+    # Names answered by the cache don't need a subrequest
+    cache_keys = {}
+    batch_indexes = []
+    for i, company_name in enumerate(company_names):
+        if cache:
+            cache_keys[i] = cache.make_key('Account', to_half_width(company_name), search_mode, field_projection.account)
+            cached = cache.get(cache_keys[i])
+            if cached is not None:
+                results_by_index[i] = cached
+                continue
+        batch_indexes.append(i)
+    
+    # Subrequest URLs are relative to /services/data
+    batch_requests = {}
+    for i in batch_indexes:
+        query = build_account_query(to_half_width(company_names[i]), search_mode)
+        batch_requests[i] = {
+            'method': 'GET',
+            'url': f"{API_VERSION}/query/?{urlencode({'q': query})}"
+        }
+    
+    # Subrequests that failed with a transient status are sent again, with
+    # the retries and backoff a single request would get
+    pending = batch_indexes
+    attempt = 0
+    while pending:
+        try:
+            started = time.perf_counter()
+            response = client.post(
+                f"{API_PATH}/composite/batch",
+                json={'batchRequests': [batch_requests[i] for i in pending], 'haltOnError': False}
+            )
+            if response.status_code != 200:
+                raise SalesforceAPIError(response.status_code, response.text)
+            subresponses = response.json()['results']
+            backend_latency.record('composite', time.perf_counter() - started, len(pending))
+        except SalesforceAPIError as e:
+            lookup_failures.record(e, [company_names[i] for i in pending])
+            print(f"Composite API call error: {e.status_code}")
+            print(e.text)
+            subresponses = [None] * len(pending)
+        except ApiBudgetExhausted:
+            raise
+        except Exception as e:
+            lookup_failures.record(e, [company_names[i] for i in pending])
+            print(f"Error: {e}")
+            subresponses = [None] * len(pending)
+        
+        # Subresponses come back in the same order as the subrequests
+        retry = []
+        throttled = False
+        for i, subresponse in zip(pending, subresponses):
+            results_by_index[i] = []
+            if subresponse is None:
+                continue
+            
+            status_code = subresponse['statusCode']
+            if (status_code in SalesforceClient.RETRY_STATUS_CODES or status_code == 503) and attempt < client.max_retries:
+                retry.append(i)
+                throttled = throttled or status_code == 503
+                continue
+            
+            # One bad name only fails its own subrequest
+            if status_code != 200:
+                lookup_failures.record(names=[company_names[i]])
+                print(f"API call error for \"{company_names[i]}\": {subresponse['statusCode']}")
+                print(json.dumps(subresponse['result'], ensure_ascii=False))
+                continue
+            
+            page = subresponse['result']
+            records = list(page['records'])
+            try:
+                # Large results continue on the normal query endpoint
+                if not page.get('done', True) and page.get('nextRecordsUrl'):
+                    for records_page in iter_query_url_pages(client, page['nextRecordsUrl']):
+                        records.extend(records_page)
+            except SalesforceAPIError as e:
+                lookup_failures.record(e, [company_names[i]])
+                print(f"API call error: {e.status_code}")
+                print(e.text)
+                continue
+            except ApiBudgetExhausted:
+                raise
+            except Exception as e:
+                lookup_failures.record(e, [company_names[i]])
+                print(f"Error: {e}")
+                continue
+            
+            results_by_index[i] = records
+            if cache:
+                cache.put(cache_keys[i], records)
+        
+        if retry:
+            attempt += 1
+            run_metrics.count('composite/batch', 'retries')
+            if throttled:
+                # The shared backoff holds back every request, this one included
+                delay = api_backoff.on_throttled()
+            else:
+                delay = client._retry_delay(attempt)
+                time.sleep(delay)
+            print(f"Server error on {len(retry)} composite subrequests, retrying in {delay:.1f}s...")
+        pending = retry
+    
+    # One contact lookup for every account found in the whole batch
+    all_account_ids = [account['Id'] for i in range(len(company_names)) for account in results_by_index[i]]
+    contacts_by_account = get_contacts_bulk(auth_info, all_account_ids, cache)
+    
+    fetched = []
+    for i, company_name in enumerate(company_names):
+        results = results_by_index[i]
+        fetched.append((
+            company_name,
+            results,
+            {account['Id']: contacts_by_account.get(account['Id'], []) for account in results}
+        ))
+    return fetched
+
+def iter_batches(items, batch_size):
+    """Split an iterable into lists of at most batch_size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def search_companies(auth_info, company_names, search_mode="partial", concurrency=1, cache=None,
+                     composite=False, name_index=None, backend='soql', compare_backends=False,
+                     report_failures=False):
+    """Search for many companies, yielding (name, results, contacts) in input order"""
+    if name_index is not None:
+        # Match names locally and only fetch the matched Account Ids
+        batch_size = INDEX_BATCH_SIZE
+        def fetch_batch(names):
+            return fetch_companies_indexed(auth_info, names, search_mode, name_index, cache)
+    elif composite:
+        # Pack many lookups into each HTTP request
+        batch_size = COMPOSITE_BATCH_SIZE
+        def fetch_batch(names):
+            return fetch_companies_composite(auth_info, names, search_mode, cache)
+    elif search_mode == "exact":
+        # Resolve many exact names with a few IN (...) queries
+        batch_size = EXACT_BATCH_SIZE
+        def fetch_batch(names):
+            return fetch_companies_exact(auth_info, names, cache)
+    else:
+        batch_size = 1
+        def fetch_batch(names):
+            return [(names[0],) + fetch_company(auth_info, names[0], search_mode, cache, backend)]
+    
+    if compare_backends and search_mode == "partial":
+        # Also time the other partial-match backend on every name; its
+        # results are discarded so the output doesn't change
+        fetch_primary = fetch_batch
+        def fetch_batch(names):
+            # Only the primary backend's failures count for the run
+            with lookup_failures.ignored():
+                for company_name in names:
+                    if backend == 'sosl':
+                        search_company(auth_info, company_name, search_mode)
+                    else:
+                        search_company_sosl(auth_info, company_name)
+            return fetch_primary(names)
+    
+    if report_failures:
+        # Failed names come back with None results instead of as "not
+        # found"; a connection or authentication error stops the search
+        fetch_unchecked = fetch_batch
+        def fetch_batch(names):
+            lookup_failures.start_batch()
+            try:
+                fetched = fetch_unchecked(names)
+            finally:
+                failed, fatal = lookup_failures.finish_batch(names)
+            if fatal:
+                raise SearchFailed(f"{msg('search_stopped')}: {names[0]}")
+            return [(entry[0], None, None) if entry[0] in failed else entry for entry in fetched]
+    
+    batches = iter_batches(company_names, batch_size)
+    
+    if concurrency <= 1:
+        for batch in batches:
+            yield from fetch_batch(batch)
+        return
+    
+    # Only keep a bounded number of searches in flight so huge input lists
+    # don't queue up tens of thousands of futures at once
+    max_pending = concurrency * 4
+    pending = deque()
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for batch in batches:
+            pending.append(executor.submit(fetch_batch, batch))
+            
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        
+        while pending:
+            yield from pending.popleft().result()
+
+# Bulk API 2.0 snapshot settings
+SNAPSHOT_DIR = 'salesforce_snapshot'
+BULK_RESULTS_MAX_RECORDS = 100000
+BULK_POLL_MAX_INTERVAL = 10
+
+def run_bulk_query(auth_info, query, output_dir, prefix):
+    """Run a Bulk API 2.0 query job and stream its CSV results to gzip files"""
+    client = get_client(auth_info)
+    jobs_path = f"{API_PATH}/jobs/query"
+    
+    # 1. Create the query job
+    response = client.post(jobs_path, json={'operation': 'query', 'query': query, 'contentType': 'CSV'})
+    if response.status_code not in (200, 201):
+        raise SalesforceAPIError(response.status_code, response.text)
+    job_id = response.json()['id']
+    
+    # 2. Poll until Salesforce has finished processing the job
+    interval = 1
+    while True:
+        response = client.get(f"{jobs_path}/{job_id}")
+        if response.status_code != 200:
+            raise SalesforceAPIError(response.status_code, response.text)
+        
+        job = response.json()
+        if job['state'] == 'JobComplete':
+            break
+        if job['state'] in ('Failed', 'Aborted'):
+            raise SalesforceAPIError(response.status_code, job.get('errorMessage') or job['state'])
+        
+        time.sleep(interval)
+        interval = min(interval * 2, BULK_POLL_MAX_INTERVAL)
+    
+    # 3. Download the result chunks, following Sforce-Locator
+    paths = []
+    locator = None
+    while True:
+        params = {'maxRecords': BULK_RESULTS_MAX_RECORDS}
+        if locator:
+            params['locator'] = locator
+        
+        response = client.get(
+            f"{jobs_path}/{job_id}/results", params=params,
+            headers={'Accept': 'text/csv', 'Accept-Encoding': 'gzip'}, stream=True
+        )
+        if response.status_code != 200:
+            raise SalesforceAPIError(response.status_code, response.text)
+        
+        path = os.path.join(output_dir, f"{prefix}_{len(paths) + 1:04d}.csv.gz")
+        with open(path, 'wb') as f:
+            if response.headers.get('Content-Encoding') == 'gzip':
+                # Keep the compressed bytes exactly as they arrive
+                shutil.copyfileobj(response.raw, f)
+            else:
+                with gzip.GzipFile(fileobj=f, mode='wb') as gz:
+                    for chunk in response.iter_content(chunk_size=65536):
+                        gz.write(chunk)
+        paths.append(path)
+        
+        locator = response.headers.get('Sforce-Locator')
+        if not locator or locator == 'null':
+            return paths
+
+def iter_snapshot_records(paths):
+    """Read records back from Bulk API result files"""
+    for path in paths:
+        with gzip.open(path, 'rt', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                # Bulk CSV uses empty strings where REST returns null
+                record = {key: (value if value != '' else None) for key, value in row.items()}
+                if record.get('NumberOfEmployees') is not None:
+                    record['NumberOfEmployees'] = int(record['NumberOfEmployees'])
+                yield record
+
+class AccountSnapshot:
+    """Full Account/Contact export from Bulk API 2.0, matched locally"""
+    
+    def __init__(self, account_paths, contact_paths):
+        self.account_paths = account_paths
+        self.contact_paths = contact_paths
+        
+        # Only case-folded names (like Salesforce's comparison) stay in
+        # memory; a slot is the account's position in the result files,
+        # and matched records are read back from there
+        self._names = NameTrigrams()
+        for account in iter_snapshot_records(account_paths):
+            self._names.add((account['Name'] or '').casefold())
+    
+    @classmethod
+    def download(cls, auth_info, output_dir=SNAPSHOT_DIR):
+        """Export Account and Contact through Bulk API query jobs"""
+        os.makedirs(output_dir, exist_ok=True)
+        
+        print("Exporting accounts with Bulk API 2.0...")
+        account_paths = run_bulk_query(
+            auth_info, f"SELECT {', '.join(field_projection.account)} FROM Account", output_dir, 'accounts'
+        )
+        print("Exporting contacts with Bulk API 2.0...")
+        contact_paths = run_bulk_query(
+            auth_info,
+            f"SELECT {', '.join(field_projection.contact)}, AccountId FROM Contact WHERE AccountId != null",
+            output_dir, 'contacts'
+        )
+        return cls(account_paths, contact_paths)
+    
+    def match(self, company_name, search_mode="partial"):
+        """Slots of the accounts search_company's SOQL would find, in file order"""
+        return self._names.lookup(to_half_width(company_name).casefold(), search_mode)
+    
+    def search_all(self, company_names, search_mode="partial"):
+        """Match every name, yielding (name, results, contacts) in input order"""
+        matches = [(company_name, self.match(company_name, search_mode)) for company_name in company_names]
+        
+        # Only keep matched accounts and their contacts in memory
+        accounts = dict.fromkeys(slot for _, slots in matches for slot in slots)
+        for slot, account in enumerate(iter_snapshot_records(self.account_paths)):
+            if slot in accounts:
+                accounts[slot] = account
+        
+        contacts_by_account = {account['Id']: [] for account in accounts.values()}
+        for contact in iter_snapshot_records(self.contact_paths):
+            if contact['AccountId'] in contacts_by_account:
+                contacts_by_account[contact['AccountId']].append(contact)
+        
+        for company_name, slots in matches:
+            results = [accounts[slot] for slot in slots]
+            yield company_name, results, {account['Id']: contacts_by_account[account['Id']] for account in results}
+
+# Local Account name index used by the "index" search backend
+NAME_INDEX_PATH = '.salesforce_name_index.sqlite3'
+FUZZY_MIN_SIMILARITY = 0.5
+FUZZY_MAX_MATCHES = 20
+
+def normalize_account_name(name):
+    """Normalize a name for local matching (half-width, case-folded)"""
+    return to_half_width(name or '').casefold()
+
+def name_trigrams(name):
+    """Set of 3-character substrings of a normalized name"""
+    return {name[i:i + 3] for i in range(len(name) - 2)}
+
+class NameTrigrams:
+    """In-memory trigram postings over normalized names, addressed by slot"""
+    
+    def __init__(self):
+        self.names = []
+        self._by_name = {}
+        # Compact slot arrays; a million names have tens of millions of entries
+        self._postings = {}
+    
+    def __len__(self):
+        return len(self.names)
+    
+    def add(self, name):
+        """Index a normalized name; returns its slot"""
+        slot = len(self.names)
+        self.names.append(name)
+        self._by_name.setdefault(name, set()).add(slot)
+        for gram in name_trigrams(name):
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array('I')
+            postings.append(slot)
+        return slot
+    
+    def remove(self, slot):
+        """Blank a slot so it no longer matches"""
+        self._by_name[self.names[slot]].discard(slot)
+        self.names[slot] = None
+    
+    def _candidates(self, grams):
+        # Intersect posting lists, smallest first
+        postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        if not postings or not postings[0]:
+            return set()
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            # Once few candidates remain, checking their names is cheaper
+            # than walking a long posting list
+            if not candidates or len(posting) > 8 * len(candidates):
+                break
+            candidates.intersection_update(posting)
+        return candidates
+    
+    def lookup(self, needle, search_mode="partial"):
+        """Slots whose name matches a normalized needle (exact, partial or fuzzy), in slot order"""
+        if search_mode == "exact":
+            return sorted(self._by_name.get(needle, ()))
+        if search_mode == "fuzzy":
+            return self._fuzzy_slots(needle)
+        
+        grams = name_trigrams(needle)
+        if grams:
+            candidates = sorted(self._candidates(grams))
+        else:
+            # Too short for trigrams, fall back to a scan
+            candidates = range(len(self.names))
+        return [
+            slot for slot in candidates
+            if self.names[slot] is not None and needle in self.names[slot]
+        ]
+    
+    def _fuzzy_slots(self, needle):
+        grams = name_trigrams(needle)
+        if not grams:
+            return sorted(self._by_name.get(needle, ()))
+        
+        # Count shared trigrams per candidate, then rank by Jaccard similarity
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        
+        scored = []
+        for slot, count in shared.items():
+            name = self.names[slot]
+            if name is None:
+                continue
+            similarity = count / (len(grams) + len(name_trigrams(name)) - count)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((-similarity, slot))
+        
+        return [slot for _, slot in sorted(scored)[:FUZZY_MAX_MATCHES]]
+
+class AccountNameIndex:
+    """Trigram index over Account names, kept in sync via LastModifiedDate"""
+    
+    def __init__(self, path=NAME_INDEX_PATH):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("CREATE TABLE IF NOT EXISTS accounts (id TEXT PRIMARY KEY, name TEXT NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+        
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'watermark'").fetchone()
+        self.watermark = row[0] if row else None
+        
+        # In-memory postings: documents are account slots, so a renamed
+        # account just gets a new slot and the old one is blanked
+        self._ids = []
+        self._slot_by_id = {}
+        self._names = NameTrigrams()
+        for account_id, name in self._db.execute("SELECT id, name FROM accounts"):
+            self._add(account_id, name)
+    
+    def __len__(self):
+        return len(self._slot_by_id)
+    
+    def _add(self, account_id, name):
+        old_slot = self._slot_by_id.get(account_id)
+        if old_slot is not None:
+            self._names.remove(old_slot)
+        
+        self._slot_by_id[account_id] = self._names.add(normalize_account_name(name))
+        self._ids.append(account_id)
+    
+    def refresh(self, auth_info):
+        """Build the index, or pull only accounts modified since the last sync"""
+        query = "SELECT Id, Name, LastModifiedDate FROM Account"
+        if self.watermark:
+            # >= so accounts sharing the watermark timestamp are never missed
+            query += f" WHERE LastModifiedDate >= {self.watermark}"
+        query += " ORDER BY LastModifiedDate"
+        
+        changed = 0
+        watermark = self.watermark
+        for records in iter_query_pages(auth_info, query):
+            rows = []
+            for account in records:
+                self._add(account['Id'], account['Name'])
+                rows.append((account['Id'], account['Name']))
+                watermark = max(watermark or '', self._soql_datetime(account['LastModifiedDate']))
+            
+            # Save each page with its watermark so an interrupted build resumes
+            self._db.executemany("INSERT OR REPLACE INTO accounts (id, name) VALUES (?, ?)", rows)
+            if watermark:
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('watermark', ?)", (watermark,))
+            self._db.commit()
+            changed += len(rows)
+        
+        self.watermark = watermark
+        return changed
+    
+    @staticmethod
+    def _soql_datetime(value):
+        # REST returns 2024-01-01T00:00:00.000+0000; SOQL literals use UTC ...Z
+        parsed = datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f%z')
+        return parsed.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    
+    def lookup(self, company_name, search_mode="partial"):
+        """Resolve a name to Account Ids (exact, partial or fuzzy)"""
+        return [self._ids[slot] for slot in self._names.lookup(normalize_account_name(company_name), search_mode)]
+    
+    def close(self):
+        self._db.close()
+
+def get_accounts_by_ids(auth_info, account_ids):
+    """Fetch full Account records for a list of Ids, keyed by Id"""
+    accounts = {}
+    quoted_ids = [soql_quote(account_id) for account_id in dict.fromkeys(account_ids)]
+    
+    for chunk in chunk_in_values(quoted_ids):
+        query = f"SELECT {', '.join(field_projection.account)} FROM Account WHERE Id IN ({','.join(chunk)})"
+        for account in iter_query_records(auth_info, query):
+            accounts[account['Id']] = account
+    return accounts
+
+# Names resolved per batch by the index backend
+INDEX_BATCH_SIZE = 100
+
+def fetch_companies_indexed(auth_info, company_names, search_mode, name_index, cache=None):
+    """Resolve names with the local index, then fetch only the matched Ids"""
+    started = time.perf_counter()
+    matched_ids = [name_index.lookup(company_name, search_mode) for company_name in company_names]
+    
+    try:
+        # Accounts deleted since the last index refresh simply don't come back
+        accounts = get_accounts_by_ids(auth_info, [account_id for ids in matched_ids for account_id in ids])
+        backend_latency.record('index', time.perf_counter() - started, len(company_names))
+    except SalesforceAPIError as e:
+        lookup_failures.record(e)
+        print(f"API call error: {e.status_code}")
+        print(e.text)
+        accounts = {}
+    except ApiBudgetExhausted:
+        raise
+    except Exception as e:
+        lookup_failures.record(e)
+        print(f"Error: {e}")
+        accounts = {}
+    
+    contacts_by_account = get_contacts_bulk(auth_info, list(accounts), cache)
+    
+    fetched = []
+    for company_name, ids in zip(company_names, matched_ids):
+        results = [accounts[account_id] for account_id in ids if account_id in accounts]
+        fetched.append((
+            company_name,
+            results,
+            {account['Id']: contacts_by_account.get(account['Id'], []) for account in results}
+        ))
+    return fetched
+
+# Local store for --sync runs. The watermark is set a little before the run
+# started so changes saved while it was running are picked up next time.
+SYNC_STORE_PATH = '.salesforce_sync.sqlite3'
+SYNC_CLOCK_SKEW_MINUTES = 10
+
+# Columns of the change-only file written by --sync runs
+CHANGE_CSV_FIELDS = ['Change', 'Object', 'Record ID', 'Account ID', 'Name', 'Changed Fields']
+
+class SyncStore:
+    """Accounts and contacts of the last export, refreshed by SystemModstamp"""
+    
+    def __init__(self, path=SYNC_STORE_PATH):
+        self.path = path
+        self.changes = []
+        self._db = sqlite3.connect(path)
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS keywords (keyword TEXT, mode TEXT, PRIMARY KEY (keyword, mode))")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS matches "
+            "(keyword TEXT, mode TEXT, position INTEGER, account_id TEXT, PRIMARY KEY (keyword, mode, account_id))"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS accounts (id TEXT PRIMARY KEY, record TEXT NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS contacts (id TEXT PRIMARY KEY, account_id TEXT, record TEXT NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS contacts_by_account ON contacts (account_id)")
+        self._db.commit()
+        
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'watermark'").fetchone()
+        self.watermark = row[0] if row else None
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'fields'").fetchone()
+        self.fields = json.loads(row[0]) if row else None
+        self._run_keywords = None
+        self._run_mode = None
+        self._run_started = None
+    
+    def update(self, auth_info, company_names, search_mode, search):
+        """Refresh stored keywords since the watermark and search new ones with search(names)"""
+        self._run_started = datetime.now(timezone.utc) - timedelta(minutes=SYNC_CLOCK_SKEW_MINUTES)
+        self._run_keywords = set(company_names)
+        self._run_mode = search_mode
+        
+        # Records stored with other fields can't be refreshed, so search again
+        known = {
+            keyword for (keyword,) in
+            self._db.execute("SELECT keyword FROM keywords WHERE mode = ?", (search_mode,))
+            if keyword in self._run_keywords
+        } if self.watermark and self.fields == field_projection.as_dict() else set()
+        
+        if known:
+            account_ids = sorted({
+                account_id for keyword in known for (account_id,) in
+                self._db.execute("SELECT account_id FROM matches WHERE keyword = ? AND mode = ?", (keyword, search_mode))
+            })
+            print(f"\nChecking {len(account_ids)} stored accounts for changes since {self.watermark}...")
+            self._refresh(auth_info, account_ids)
+        
+        new_names = [company_name for company_name in dict.fromkeys(company_names) if company_name not in known]
+        if new_names:
+            print(f"\nSearching {len(new_names)} names not in the sync store...")
+            for company_name, results, contacts_by_account in search(new_names):
+                self._add_keyword(company_name, search_mode, results, contacts_by_account)
+        
+        print(f"Sync: {len(self.changes)} changed records")
+    
+    def _refresh(self, auth_info, account_ids):
+        since = self.watermark
+        for chunk in chunk_in_values([soql_quote(account_id) for account_id in account_ids]):
+            ids = ','.join(chunk)
+            
+            # Accounts: changed ones are updated, missing ones were deleted
+            existing = {record['Id'] for record in iter_query_records(auth_info, f"SELECT Id FROM Account WHERE Id IN ({ids})")}
+            query = f"SELECT {', '.join(field_projection.account)} FROM Account WHERE SystemModstamp > {since} AND Id IN ({ids})"
+            for account in iter_query_records(auth_info, query):
+                self._update_account(account)
+            for quoted_id in chunk:
+                if quoted_id.strip("'") not in existing:
+                    self._delete_account(quoted_id.strip("'"))
+            
+            # Contacts: changed or newly attached ones are upserted, contacts
+            # no longer under these accounts were deleted or moved away
+            current = {record['Id'] for record in iter_query_records(auth_info, f"SELECT Id FROM Contact WHERE AccountId IN ({ids})")}
+            query = (
+                f"SELECT {', '.join(field_projection.contact)}, AccountId FROM Contact "
+                f"WHERE SystemModstamp > {since} AND AccountId IN ({ids})"
+            )
+            for contact in iter_query_records(auth_info, query):
+                self._update_contact(contact)
+            
+            stored = self._db.execute(
+                f"SELECT id, record FROM contacts WHERE account_id IN ({ids})"
+            ).fetchall()
+            for contact_id, record in stored:
+                if contact_id not in current:
+                    self._db.execute("DELETE FROM contacts WHERE id = ?", (contact_id,))
+                    self._record_change('deleted', 'Contact', json.loads(record))
+    
+    def _record_change(self, change, sobject, record, changed_fields=()):
+        self.changes.append({
+            'Change': change,
+            'Object': sobject,
+            'Record ID': record.get('Id', ''),
+            'Account ID': record.get('Id', '') if sobject == 'Account' else record.get('AccountId', ''),
+            'Name': record.get('Name', ''),
+            'Changed Fields': ' '.join(changed_fields)
+        })
+    
+    def _stored(self, table, record_id):
+        row = self._db.execute(f"SELECT record FROM {table} WHERE id = ?", (record_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def _update_account(self, account):
+        old = self._stored('accounts', account['Id'])
+        changed_fields = [field for field in field_projection.account if old is None or old.get(field) != account.get(field)]
+        if not changed_fields:
+            return
+        
+        self._db.execute("INSERT OR REPLACE INTO accounts (id, record) VALUES (?, ?)", (account['Id'], json.dumps(account)))
+        if old is None:
+            self._record_change('added', 'Account', account)
+        else:
+            self._record_change('updated', 'Account', account, changed_fields)
+        
+        # A renamed account drops out of keywords it no longer matches
+        matches = self._db.execute("SELECT keyword, mode FROM matches WHERE account_id = ?", (account['Id'],)).fetchall()
+        for keyword, mode in matches:
+            if not account_matches(account, keyword, mode):
+                self._db.execute(
+                    "DELETE FROM matches WHERE keyword = ? AND mode = ? AND account_id = ?", (keyword, mode, account['Id'])
+                )
+    
+    def _delete_account(self, account_id):
+        account = self._stored('accounts', account_id)
+        self._db.execute("DELETE FROM matches WHERE account_id = ?", (account_id,))
+        self._db.execute("DELETE FROM accounts WHERE id = ?", (account_id,))
+        if account:
+            self._record_change('deleted', 'Account', account)
+        
+        for (record,) in self._db.execute("SELECT record FROM contacts WHERE account_id = ?", (account_id,)).fetchall():
+            self._record_change('deleted', 'Contact', json.loads(record))
+        self._db.execute("DELETE FROM contacts WHERE account_id = ?", (account_id,))
+    
+    def _update_contact(self, contact):
+        old = self._stored('contacts', contact['Id'])
+        changed_fields = [
+            field for field in field_projection.contact + ['AccountId']
+            if old is None or old.get(field) != contact.get(field)
+        ]
+        if not changed_fields:
+            return
+        
+        self._db.execute(
+            "INSERT OR REPLACE INTO contacts (id, account_id, record) VALUES (?, ?, ?)",
+            (contact['Id'], contact['AccountId'], json.dumps(contact))
+        )
+        if old is None:
+            self._record_change('added', 'Contact', contact)
+        else:
+            self._record_change('updated', 'Contact', contact, changed_fields)
+    
+    def _add_keyword(self, company_name, search_mode, results, contacts_by_account):
+        self._db.execute("INSERT OR REPLACE INTO keywords (keyword, mode) VALUES (?, ?)", (company_name, search_mode))
+        self._db.execute("DELETE FROM matches WHERE keyword = ? AND mode = ?", (company_name, search_mode))
+        
+        for position, account in enumerate(results):
+            self._db.execute(
+                "INSERT OR REPLACE INTO matches (keyword, mode, position, account_id) VALUES (?, ?, ?, ?)",
+                (company_name, search_mode, position, account['Id'])
+            )
+            self._update_account(account)
+            
+            # The contact lists from a full search are complete
+            for contact in contacts_by_account.get(account['Id'], []):
+                self._update_contact(dict(contact, AccountId=account['Id']))
+    
+    def search_all(self, company_names):
+        """Yield (name, results, contacts) from the store in input order"""
+        for company_name in company_names:
+            rows = self._db.execute(
+                "SELECT a.record FROM matches m JOIN accounts a ON a.id = m.account_id "
+                "WHERE m.keyword = ? AND m.mode = ? ORDER BY m.position",
+                (company_name, self._run_mode)
+            ).fetchall()
+            results = [json.loads(record) for (record,) in rows]
+            
+            contacts_by_account = {}
+            for account in results:
+                contacts_by_account[account['Id']] = [
+                    json.loads(record) for (record,) in
+                    self._db.execute("SELECT record FROM contacts WHERE account_id = ? ORDER BY id", (account['Id'],))
+                ]
+            yield company_name, results, contacts_by_account
+    
+    def write_changes(self, filename):
+        """Write the change-only CSV for this run"""
+        with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.DictWriter(f, fieldnames=CHANGE_CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.changes)
+        print(f"Exported {len(self.changes)} changed records to CSV file: {filename}")
+    
+    def commit(self):
+        """Save this run as the new baseline, forgetting keywords it didn't search"""
+        for keyword, mode in self._db.execute("SELECT keyword, mode FROM keywords").fetchall():
+            if mode != self._run_mode or keyword not in self._run_keywords:
+                self._db.execute("DELETE FROM keywords WHERE keyword = ? AND mode = ?", (keyword, mode))
+                self._db.execute("DELETE FROM matches WHERE keyword = ? AND mode = ?", (keyword, mode))
+        self._db.execute("DELETE FROM accounts WHERE id NOT IN (SELECT account_id FROM matches)")
+        self._db.execute("DELETE FROM contacts WHERE account_id NOT IN (SELECT id FROM accounts)")
+        
+        self.watermark = self._run_started.strftime('%Y-%m-%dT%H:%M:%SZ')
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('watermark', ?)", (self.watermark,))
+        self.fields = field_projection.as_dict()
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fields', ?)", (json.dumps(self.fields),))
+        self._db.commit()
+    
+    def close(self):
+        """Close the store; anything not committed is rolled back"""
+        self._db.close()
+
+def account_matches(account, company_name, search_mode="partial"):
+    """Check locally whether an account matches a name like the SOQL search would"""
+    needle = normalize_account_name(company_name)
+    name = normalize_account_name(account.get('Name'))
+    return name == needle if search_mode == "exact" else needle in name
+
+def format_address(account):
+    """Format address information"""
+    address_parts = []
+    
+    # Add address components if they exist
+    if account.get('BillingPostalCode'):
+        address_parts.append(account['BillingPostalCode'])
+    
+    if account.get('BillingCountry'):
+        address_parts.append(account['BillingCountry'])
+        
+    if account.get('BillingState'):
+        address_parts.append(account['BillingState'])
+        
+    if account.get('BillingCity'):
+        address_parts.append(account['BillingCity'])
+        
+    if account.get('BillingStreet'):
+        address_parts.append(account['BillingStreet'])
+    
+    # Join address components
+    return " ".join(address_parts) if address_parts else "No address available"
+
+class AccountRow:
+    """One account (or not-found keyword) row of the search results"""
+    
+    __slots__ = ('search_keyword', 'status', 'account_id', 'name', 'address',
+                 'phone', 'website', 'industry', 'employees', 'description', 'extra')
+    
+    def __init__(self, search_keyword, status, account_id, name='', address='',
+                 phone='', website='', industry='', employees='', description='', extra=()):
+        self.search_keyword = search_keyword
+        self.status = status
+        self.account_id = account_id
+        self.name = name
+        self.address = address
+        self.phone = phone
+        self.website = website
+        self.industry = industry
+        self.employees = employees
+        self.description = description
+        # Values of field_projection.account_extra, in order
+        self.extra = extra
+    
+    @classmethod
+    def from_account(cls, company_name, account):
+        return cls(
+            company_name, 'Found in Salesforce', account['Id'], account['Name'],
+            format_address(account), account.get('Phone', ''), account.get('Website', ''),
+            account.get('Industry', ''), account.get('NumberOfEmployees', ''),
+            account.get('Description', ''), extra_values(account, field_projection.account_extra)
+        )
+    
+    def as_dict(self):
+        """The row as the flat dict display_results used to return"""
+        row = {
+            'SearchKeyword': self.search_keyword,
+            'SFStatus': self.status,
+            'AccountId': self.account_id,
+            'AccountName': self.name,
+            'AccountAddress': self.address,
+            'AccountPhone': self.phone,
+            'Website': self.website,
+            'Industry': self.industry,
+            'NumberOfEmployees': self.employees,
+            'Description': self.description
+        }
+        row.update(zip(field_projection.account_extra, self.extra or ('',) * len(field_projection.account_extra)))
+        return row
+
+class ContactRow:
+    """One contact row; the account fields are shared through its AccountRow"""
+    
+    __slots__ = ('account', 'contact_id', 'name', 'title', 'email', 'phone', 'department', 'extra')
+    
+    def __init__(self, account, contact):
+        self.account = account
+        self.contact_id = contact['Id']
+        self.name = contact.get('Name', '')
+        self.title = contact.get('Title', '')
+        self.email = contact.get('Email', '')
+        self.phone = contact.get('Phone', '')
+        self.department = contact.get('Department', '')
+        self.extra = extra_values(contact, field_projection.contact_extra)
+    
+    def as_dict(self):
+        """The row as the flat dict display_results used to return"""
+        row = self.account.as_dict()
+        row.update({
+            'ContactId': self.contact_id,
+            'ContactName': self.name,
+            'ContactTitle': self.title,
+            'ContactEmail': self.email,
+            'ContactPhone': self.phone,
+            'ContactDepartment': self.department
+        })
+        row.update(zip(field_projection.contact_extra_columns(), self.extra))
+        return row
+
+def build_company_rows(results, company_name="", contacts_by_account=None):
+    """Build the account/contact rows for one search, without printing"""
+    contacts_by_account = contacts_by_account or {}
+    
+    # List to store all company data
+    all_company_data = []
+    
+    if not results:
+        # Add dummy data for not found companies
+        if company_name:
+            all_company_data.append(AccountRow(company_name, 'Not found in Salesforce', 'Not in Salesforce'))
+        return all_company_data
+    
+    for account in results:
+        account_row = AccountRow.from_account(company_name, account)
+        contacts = contacts_by_account.get(account['Id'], [])
+        
+        # If no contacts, still add the account data
+        if not contacts:
+            all_company_data.append(account_row)
+            continue
+        
+        # Contacts point at the account row instead of copying its fields;
+        # they are joined when the contact file is written
+        all_company_data.extend(ContactRow(account_row, contact) for contact in contacts)
+    
+    return all_company_data
+
+def format_results_text(results, company_name="", contacts_by_account=None):
+    """Format search results as the console text shown by display_results"""
+    contacts_by_account = contacts_by_account or {}
+    total_accounts = len(results)
+    lines = []
+    
+    if company_name:
+        lines.append(f"\nSearch results for company name \"{company_name}\":")
+    lines.append(f"Number of accounts found: {total_accounts}")
+    
+    if total_accounts == 0:
+        lines.append("No company information found.")
+        return lines
+    
+    for i, account in enumerate(results, 1):
+        lines.append(f"\n===== Account {i} =====")
+        lines.append(f"Account ID: {account['Id']}")
+        lines.append(f"Company Name: {account['Name']}")
+        lines.append(f"Address: {format_address(account)}")
+        
+        if account.get('Phone'):
+            lines.append(f"Phone: {account['Phone']}")
+        
+        if account.get('Website'):
+            lines.append(f"Website: {account.get('Website')}")
+            
+        if account.get('Industry'):
+            lines.append(f"Industry: {account.get('Industry')}")
+            
+        if account.get('NumberOfEmployees'):
+            lines.append(f"Number of Employees: {account.get('NumberOfEmployees')}")
+            
+        if account.get('Description'):
+            lines.append(f"Description: {account.get('Description')}")
+        
+        for field in field_projection.account_extra:
+            if account.get(field) is not None:
+                lines.append(f"{field}: {account[field]}")
+        
+        # Related contacts
+        contacts = contacts_by_account.get(account['Id'], [])
+        
+        if not contacts:
+            lines.append("\n  No related contacts found.")
+            continue
+        
+        lines.append(f"\n  === Related Contacts ({len(contacts)} found) ===")
+        for j, contact in enumerate(contacts, 1):
+            lines.append(f"\n  --- Contact {j} ---")
+            lines.append(f"  Contact ID: {contact['Id']}")
+            lines.append(f"  Name: {contact.get('Name', 'N/A')}")
+            lines.append(f"  Title: {contact.get('Title', 'N/A')}")
+            lines.append(f"  Email: {contact.get('Email', 'N/A')}")
+            lines.append(f"  Phone: {contact.get('Phone', 'N/A')}")
+            lines.append(f"  Department: {contact.get('Department', 'N/A')}")
+            for field in field_projection.contact_extra:
+                lines.append(f"  {field}: {contact.get(field, 'N/A')}")
+    
+    return lines
+
+def display_results(auth_info, results, company_name="", contacts_by_account=None):
+    """Display search results"""
+    # Fetch contacts for all accounts in bulk rather than one query per account
+    if contacts_by_account is None and results:
+        contacts_by_account = get_contacts_bulk(auth_info, [account['Id'] for account in results])
+    
+    started = time.perf_counter()
+    print("\n".join(format_results_text(results, company_name, contacts_by_account)))
+    run_metrics.add_time('display', time.perf_counter() - started)
+    return build_company_rows(results, company_name, contacts_by_account)
+
+class VerboseRenderer:
+    """Print every account and contact, as the interactive tool always has"""
+    
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+    
+    def start(self, total=None):
+        pass
+    
+    def render(self, company_name, results, contacts_by_account, rows):
+        lines = [f"\n{msg('searching_for')} \"{company_name}\"..."]
+        lines.extend(format_results_text(results, company_name, contacts_by_account))
+        
+        # One write per company instead of one print per line
+        self.stream.write("\n".join(lines) + "\n")
+    
+    def finish(self):
+        pass
+
+class SilentRenderer:
+    """Print nothing per company"""
+    
+    def __init__(self, stream=None):
+        pass
+    
+    def start(self, total=None):
+        pass
+    
+    def render(self, company_name, results, contacts_by_account, rows):
+        pass
+    
+    def finish(self):
+        pass
+
+class JsonLinesRenderer:
+    """Print one JSON object per exported row, for log collectors"""
+    
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+    
+    def start(self, total=None):
+        pass
+    
+    def render(self, company_name, results, contacts_by_account, rows):
+        self.stream.write("".join(json.dumps(row.as_dict(), ensure_ascii=False) + "\n" for row in rows))
+    
+    def finish(self):
+        self.stream.flush()
+
+class ProgressRenderer:
+    """Single-line progress bar with throughput and ETA on stderr"""
+    
+    def __init__(self, stream=None, interval=0.5, width=30):
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.width = width
+        self.total = None
+        self.done = 0
+        self.found = 0
+        self.rows = 0
+        self._started = None
+        self._last_draw = 0.0
+    
+    def start(self, total=None):
+        self.total = total
+        self._started = time.monotonic()
+    
+    def render(self, company_name, results, contacts_by_account, rows):
+        self.done += 1
+        self.found += bool(results)
+        self.rows += len(rows)
+        
+        # Redrawing is throttled so the bar itself stays cheap
+        now = time.monotonic()
+        if now - self._last_draw >= self.interval:
+            self._last_draw = now
+            self._draw(now)
+    
+    def _draw(self, now):
+        elapsed = max(now - self._started, 1e-9)
+        rate = self.done / elapsed
+        counts = f"{self.found} found, {self.rows} rows, {rate:.1f} names/s"
+        
+        if self.total:
+            filled = min(int(self.width * self.done / self.total), self.width)
+            bar = "#" * filled + "-" * (self.width - filled)
+            remaining = max(self.total - self.done, 0) / rate
+            minutes, seconds = divmod(int(remaining), 60)
+            status = f"[{bar}] {self.done}/{self.total}, {counts}, ETA {minutes:d}:{seconds:02d}"
+        else:
+            # Total is unknown when names are streamed, so no bar or ETA
+            status = f"{self.done} names, {counts}"
+        
+        self.stream.write(f"\r{status}")
+        self.stream.flush()
+    
+    def finish(self):
+        if self._started is not None:
+            self._draw(time.monotonic())
+            self.stream.write("\n")
+            self.stream.flush()
+
+# Console renderers selectable with --console
+RENDERERS = {
+    'verbose': VerboseRenderer,
+    'progress': ProgressRenderer,
+    'jsonl': JsonLinesRenderer,
+    'silent': SilentRenderer
+}
+
+# CSV column layouts for the two export files
+COMPANY_CSV_FIELDS = [
+    'Search Keyword', 'Salesforce ID', 'Company Name', 
+    'Postal Code', 'Full Address', 'Phone', 'Website', 
+    'Industry', 'Number of Employees', 'Description'
+]
+
+CONTACT_CSV_FIELDS = [
+    'Search Keyword', 'Salesforce Status',
+    'Account ID', 'Company Name', 'Company Address', 'Company Phone', 
+    'Website', 'Industry', 'Number of Employees', 'Description',
+    'Contact ID', 'Contact Name', 'Title', 'Contact Email', 
+    'Contact Phone', 'Department'
+]
+
+# Column types for the typed export formats (JSONL, Parquet); any column
+# not listed here is text
+COLUMN_TYPES = {
+    'Number of Employees': int
+}
+
+def typed_row(row):
+    """Convert a CSV row in place to typed values, with None for empty cells"""
+    for column, column_type in COLUMN_TYPES.items():
+        value = row.get(column)
+        if value in ('', None):
+            row[column] = None
+            continue
+        try:
+            row[column] = column_type(value)
+        except (TypeError, ValueError):
+            row[column] = None
+    return row
+
+def parquet_schema(fields):
+    """Arrow schema for one of the CSV column layouts"""
+    import pyarrow as pa
+    
+    arrow_types = {int: pa.int64(), float: pa.float64(), str: pa.string()}
+    return pa.schema([(field, arrow_types[COLUMN_TYPES.get(field, str)]) for field in fields])
+
+def company_csv_rows(company_name, results):
+    """Build the company CSV rows for one search keyword"""
+    extra_fields = field_projection.account_extra
+    if not results:
+        # Add empty row for companies not found
+        row = {
+            'Search Keyword': company_name,
+            'Salesforce ID': 'Not in Salesforce',
+            'Company Name': '',
+            'Postal Code': '',
+            'Full Address': '',
+            'Phone': '',
+            'Website': '',
+            'Industry': '',
+            'Number of Employees': '',
+            'Description': ''
+        }
+        row.update(dict.fromkeys(extra_fields, ''))
+        return [row]
+    
+    rows = []
+    # Add data for each account found
+    for account in results:
+        # Get postal code
+        postal_code = account.get('BillingPostalCode', '')
+        
+        # Format address
+        address_parts = []
+        if account.get('BillingCountry'):
+            address_parts.append(account['BillingCountry'])
+        if account.get('BillingState'):
+            address_parts.append(account['BillingState'])
+        if account.get('BillingCity'):
+            address_parts.append(account['BillingCity'])
+        if account.get('BillingStreet'):
+            address_parts.append(account['BillingStreet'])
+        address = " ".join(address_parts) if address_parts else ""
+        
+        row = {
+            'Search Keyword': company_name,
+            'Salesforce ID': account['Id'],
+            'Company Name': account.get('Name', ''),
+            'Postal Code': postal_code,
+            'Full Address': address,
+            'Phone': account.get('Phone', ''),
+            'Website': account.get('Website', ''),
+            'Industry': account.get('Industry', ''),
+            'Number of Employees': account.get('NumberOfEmployees', ''),
+            'Description': account.get('Description', '')
+        }
+        row.update(zip(extra_fields, extra_values(account, extra_fields)))
+        rows.append(row)
+    return rows
+
+def contact_csv_row(row):
+    """Build a contact CSV row from an AccountRow or ContactRow, joining in the account"""
+    is_contact = isinstance(row, ContactRow)
+    account = row.account if is_contact else row
+    csv_row = {
+        'Search Keyword': account.search_keyword,
+        'Salesforce Status': account.status,
+        'Account ID': account.account_id,
+        'Company Name': account.name,
+        'Company Address': account.address,
+        'Company Phone': account.phone,
+        'Website': account.website,
+        'Industry': account.industry,
+        'Number of Employees': account.employees,
+        'Description': account.description,
+        'Contact ID': row.contact_id if is_contact else '',
+        'Contact Name': row.name if is_contact else '',
+        'Title': row.title if is_contact else '',
+        'Contact Email': row.email if is_contact else '',
+        'Contact Phone': row.phone if is_contact else '',
+        'Department': row.department if is_contact else ''
+    }
+    
+    # Extra fields from the configured projection go after the standard columns
+    account_extra = field_projection.account_extra
+    contact_extra = field_projection.contact_extra
+    csv_row.update(zip(account_extra, account.extra or ('',) * len(account_extra)))
+    csv_row.update(zip(
+        field_projection.contact_extra_columns(),
+        row.extra if is_contact else ('',) * len(contact_extra)
+    ))
+    return csv_row
+
+class RowExporter:
+    """Write company and contact files incrementally as searches finish"""
+    
+    # File extension, name used in messages, optional module it needs, and
+    # whether a checkpoint can truncate the files and append to them
+    extension = ''
+    label = ''
+    requires = None
+    resumable = False
+    
+    def __init__(self, output_dir='', timestamp=None, flush_every=50, on_flush=None,
+                 account_filename=None, contact_filename=None):
+        # Get current timestamp for filename
+        timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.account_filename = account_filename or os.path.join(output_dir, f"salesforce_companies_{timestamp}{self.extension}")
+        self.contact_filename = contact_filename or os.path.join(output_dir, f"salesforce_contacts_{timestamp}{self.extension}")
+        self.flush_every = flush_every
+        self.on_flush = on_flush
+        self.has_contacts = False
+        self._pending = 0
+        self._opened = False
+    
+    def open(self, resume_offsets=None):
+        """Create both files, or reopen them at a checkpoint to append"""
+        self._open_files(resume_offsets)
+        self._opened = True
+        return self
+    
+    def write_companies(self, company_name, results):
+        """Append the company rows for one search keyword"""
+        self._write_account_rows(company_csv_rows(company_name, results))
+    
+    def write_contacts(self, company_data):
+        """Append contact rows built by build_company_rows"""
+        rows = []
+        for row in company_data:
+            if isinstance(row, ContactRow):
+                self.has_contacts = True
+            rows.append(contact_csv_row(row))
+        self._write_contact_rows(rows)
+    
+    def write(self, company_name, results, company_data):
+        """Append all rows for one search keyword"""
+        self.write_companies(company_name, results)
+        self.write_contacts(company_data)
+        
+        # Flush periodically so a crash loses at most a few searches
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+    
+    def flush(self):
+        """Push buffered rows to disk"""
+        self._flush_files()
+        self._pending = 0
+        
+        if self.on_flush:
+            self.on_flush(self)
+    
+    def close(self, discard_empty_contacts=True):
+        """Close both files, dropping the contacts file if it has no contacts"""
+        if not self._opened:
+            return
+        
+        self.flush()
+        self._close_files()
+        self._opened = False
+        
+        print(f"\nExported company information to {self.label} file: {self.account_filename}")
+        
+        # Only keep the contacts file if we have contact data (an
+        # interrupted run keeps it so it can be resumed)
+        if self.has_contacts:
+            print(f"Exported contact information to {self.label} file: {self.contact_filename}")
+        elif discard_empty_contacts:
+            os.remove(self.contact_filename)
+    
+    def __enter__(self):
+        return self.open()
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class CsvExporter(RowExporter):
+    """Company and contact CSV files (UTF-8 with BOM for Excel)"""
+    
+    extension = '.csv'
+    label = 'CSV'
+    resumable = True
+    
+    def _open_files(self, resume_offsets):
+        if resume_offsets:
+            self._account_file = self._reopen(self.account_filename, resume_offsets[0])
+            self._account_writer = csv.DictWriter(self._account_file, fieldnames=field_projection.company_csv_fields())
+            self._contact_file = self._reopen(self.contact_filename, resume_offsets[1])
+            self._contact_writer = csv.DictWriter(self._contact_file, fieldnames=field_projection.contact_csv_fields())
+            return
+        
+        self._account_file = open(self.account_filename, 'w', newline='', encoding='utf-8-sig')
+        self._account_writer = csv.DictWriter(self._account_file, fieldnames=field_projection.company_csv_fields())
+        self._account_writer.writeheader()
+        
+        self._contact_file = open(self.contact_filename, 'w', newline='', encoding='utf-8-sig')
+        self._contact_writer = csv.DictWriter(self._contact_file, fieldnames=field_projection.contact_csv_fields())
+        self._contact_writer.writeheader()
+    
+    def _reopen(self, filename, offset):
+        # Drop rows written after the checkpoint, then append (no second BOM)
+        with open(filename, 'r+b') as f:
+            f.truncate(offset)
+        return open(filename, 'a', newline='', encoding='utf-8-sig')
+    
+    def offsets(self):
+        """Current byte size of both files (call after flush)"""
+        return self._account_file.tell(), self._contact_file.tell()
+    
+    def _write_account_rows(self, rows):
+        self._account_writer.writerows(rows)
+    
+    def _write_contact_rows(self, rows):
+        self._contact_writer.writerows(rows)
+    
+    def _flush_files(self):
+        self._account_file.flush()
+        self._contact_file.flush()
+    
+    def _close_files(self):
+        self._account_file.close()
+        self._contact_file.close()
+
+class JsonLinesExporter(RowExporter):
+    """Gzip-compressed JSON lines with typed values, one object per row"""
+    
+    extension = '.jsonl.gz'
+    label = 'gzip JSONL'
+    resumable = True
+    
+    def _open_files(self, resume_offsets):
+        # Each flush appends one complete gzip member (or zstd frame), so
+        # the files are valid at every checkpoint and can be truncated back
+        # to one on resume
+        offsets = resume_offsets or (0, 0)
+        self._account_file = self._reopen(self.account_filename, offsets[0])
+        self._contact_file = self._reopen(self.contact_filename, offsets[1])
+        self._account_lines = []
+        self._contact_lines = []
+    
+    def _reopen(self, filename, offset):
+        with open(filename, 'ab') as f:
+            f.truncate(offset)
+        return open(filename, 'ab')
+    
+    def offsets(self):
+        """Current byte size of both files (call after flush)"""
+        return self._account_file.tell(), self._contact_file.tell()
+    
+    def _compress(self, data):
+        return gzip.compress(data)
+    
+    def _write_account_rows(self, rows):
+        self._account_lines.extend(json.dumps(typed_row(row), ensure_ascii=False) + "\n" for row in rows)
+    
+    def _write_contact_rows(self, rows):
+        self._contact_lines.extend(json.dumps(typed_row(row), ensure_ascii=False) + "\n" for row in rows)
+    
+    def _flush_files(self):
+        for f, lines in ((self._account_file, self._account_lines), (self._contact_file, self._contact_lines)):
+            if lines:
+                f.write(self._compress("".join(lines).encode('utf-8')))
+                lines.clear()
+            f.flush()
+    
+    def _close_files(self):
+        self._account_file.close()
+        self._contact_file.close()
+
+# Zstandard compression level for .jsonl.zst exports
+ZSTD_LEVEL = 6
 
-def get_salesforce_oauth_token(username, password, client_id, client_secret):
-    """Get Salesforce access token using OAuth2 password flow"""
+class ZstdJsonLinesExporter(JsonLinesExporter):
+    """Zstandard-compressed JSON lines (needs the zstandard package)"""
     
-    # OAuth2 token endpoint
-    token_url = 'https://login.salesforce.com/services/oauth2/token'
+    extension = '.jsonl.zst'
+    label = 'zstd JSONL'
+    requires = 'zstandard'
     
-    # Request parameters
-    params = {
-        'grant_type': 'password',
-        'client_id': client_id,
-        'client_secret': client_secret,
-        'username': username,
-        'password': password
-    }
+    def _compress(self, data):
+        import zstandard
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+# Rows buffered per Parquet row group
+PARQUET_ROW_GROUP_ROWS = 50000
+
+class ParquetExporter(RowExporter):
+    """Typed Parquet files written one row group at a time (needs pyarrow)"""
     
-    # POST request to get token
-    response = requests.post(token_url, data=params)
+    extension = '.parquet'
+    label = 'Parquet'
+    requires = 'pyarrow'
     
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Authentication error: {response.status_code}")
-        print(response.text)
-        return None
+    def _open_files(self, resume_offsets):
+        import pyarrow.parquet as pq
+        
+        self._account_writer = pq.ParquetWriter(self.account_filename, parquet_schema(field_projection.company_csv_fields()))
+        self._contact_writer = pq.ParquetWriter(self.contact_filename, parquet_schema(field_projection.contact_csv_fields()))
+        self._account_rows = []
+        self._contact_rows = []
+    
+    def _write_account_rows(self, rows):
+        self._account_rows.extend(typed_row(row) for row in rows)
+    
+    def _write_contact_rows(self, rows):
+        self._contact_rows.extend(typed_row(row) for row in rows)
+    
+    def _flush_files(self, final=False):
+        import pyarrow as pa
+        
+        # Row groups are only cut once they are large enough to scan well
+        for writer, rows in ((self._account_writer, self._account_rows), (self._contact_writer, self._contact_rows)):
+            if rows and (final or len(rows) >= PARQUET_ROW_GROUP_ROWS):
+                writer.write_table(pa.Table.from_pylist(rows, schema=writer.schema))
+                rows.clear()
+    
+    def _close_files(self):
+        self._flush_files(final=True)
+        self._account_writer.close()
+        self._contact_writer.close()
 
-def to_half_width(text):
-    """Convert full-width characters to half-width"""
-    return unicodedata.normalize('NFKC', text)
+# Export formats selectable with --format
+EXPORTERS = {
+    'csv': CsvExporter,
+    'jsonl.gz': JsonLinesExporter,
+    'jsonl.zst': ZstdJsonLinesExporter,
+    'parquet': ParquetExporter
+}
 
+# Default checkpoint journal for resumable runs
+CHECKPOINT_PATH = 'salesforce_checkpoint.jsonl'
 
-            return []
+class CheckpointJournal:
+    """Append-only JSONL journal of search keywords already exported"""
     
-    print(f"Could not read CSV file. Encoding might not be supported: {file_path}")
-    return []
-
-def search_company(auth_info, company_name, search_mode="partial"):
-    """Search for company information (partial or exact match)"""
-    if not auth_info:
-        return False, []
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = path
+        self.run = None
+        self.completed = Counter()
+        self.failed = Counter()
+        self.failures = 0
+        self.offsets = None
+        self.has_contacts = False
+        self._uncommitted = []
+        self._file = None
     
-    # Convert full-width to half-width characters
-    company_name = to_half_width(company_name)
+    def load(self):
+        """Read a previous run's journal; returns False if there is none"""
+        if not os.path.exists(self.path):
+            return False
+        
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Ignore a line torn by a crash mid-write
+                    continue
+                
+                if entry['type'] == 'run':
+                    self.run = entry
+                elif entry['type'] == 'commit':
+                    self.completed.update(entry['keywords'])
+                    self.offsets = entry['offsets']
+                    self.has_contacts = entry['has_contacts']
+                elif entry['type'] == 'failed':
+                    self.failed.update(entry['keywords'])
+        
+        # A name that failed and then succeeded on a later resume is done
+        self.failed -= self.completed
+        return self.run is not None
     
-    # Get instance URL and access token
-    instance_url = auth_info['instance_url']
-    access_token = auth_info['access_token']
+    def start(self, exporter, search_mode, export_format='csv'):
+        """Begin a new journal for a fresh run"""
+        self.run = {
+            'type': 'run',
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'search_mode': search_mode,
+            'format': export_format,
+            'fields': field_projection.as_dict(),
+            'account_file': exporter.account_filename,
+            'contact_file': exporter.contact_filename
+        }
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._append(self.run)
     
-    # API endpoint
-    api_url = f"{instance_url}/services/data/v60.0/query/"
+    def reopen(self):
+        """Continue appending to a loaded journal"""
+        self._file = open(self.path, 'a', encoding='utf-8')
     
-    # SOQL query - get company info and needed fields
-    # Change condition based on search mode
-    if search_mode == "exact":
-        where_clause = f"WHERE Name = '{company_name}'"
-    else:
-        where_clause = f"WHERE Name LIKE '%{company_name}%'"
+    def pending(self, company_names):
+        """Yield the names that still need to be searched"""
+        remaining = Counter(self.completed)
+        for company_name in company_names:
+            # Duplicate keywords are skipped as many times as they completed
+            if remaining[company_name] > 0:
+                remaining[company_name] -= 1
+                continue
+            yield company_name
     
-    # Specify fields (using standard fields only)
-    query = (
-        "SELECT Id, Name, "
-        "BillingStreet, BillingCity, BillingState, BillingPostalCode, BillingCountry, "
-        "Phone, Website, Description, Industry, NumberOfEmployees "
-        "FROM Account "
-        f"{where_clause}"
-    )
+    def record(self, company_name):
+        """Note a keyword whose rows were handed to the exporter"""
+        self._uncommitted.append(company_name)
     
-    # Request headers
-    headers = {
-        'Authorization': f"Bearer {access_token}",
-        'Content-Type': 'application/json'
-    }
+    def fail(self, company_name):
+        """Note a keyword whose lookup failed; it stays pending for --resume"""
+        self._append({'type': 'failed', 'keywords': [company_name]})
+        self.failures += 1
     
-    # GET request to fetch data
-    try:
-        response = requests.get(api_url, headers=headers, params={'q': query})
+    def commit(self, exporter):
+        """Mark recorded keywords complete once their rows are on disk"""
+        if not self._uncommitted or self._file is None:
+            return
         
-        if response.status_code == 200:
-            results = response.json()['records']
-            return len(results) > 0, results
-        else:
-            print(f"API call error: {response.status_code}")
-            print(response.text)
-            return False, []
-    except Exception as e:
-        print(f"Error: {e}")
-        return False, []
+        self._append({
+            'type': 'commit',
+            'keywords': self._uncommitted,
+            'offsets': list(exporter.offsets()),
+            'has_contacts': exporter.has_contacts
+        })
+        self.completed.update(self._uncommitted)
+        self._uncommitted = []
+    
+    def _append(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+    
+    def close(self, finished=False):
+        """Close the journal, deleting it once every keyword has been exported"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if finished and os.path.exists(self.path):
+            os.remove(self.path)
 
-def get_contacts(auth_info, account_id):
-    """Get contacts related to an account"""
-    if not auth_info:
-        return []
+# Sharded runs deal the input out in blocks of this many names, so each
+# shard's rows for a block sit between two recorded file offsets
+SHARD_BLOCK_SIZE = 1000
+SHARD_COPY_CHUNK = 1024 * 1024
+
+def shard_names(company_names, shard_index, shard_count, block_size=SHARD_BLOCK_SIZE):
+    """Yield the names of one shard: every shard_count-th block of the input"""
+    for position, company_name in enumerate(company_names):
+        if (position // block_size) % shard_count == shard_index:
+            yield company_name
+
+def shard_name_count(total, shard_index, shard_count, block_size=SHARD_BLOCK_SIZE):
+    """How many of the first total names shard_names deals to one shard"""
+    cycles, rest = divmod(total, block_size * shard_count)
+    return cycles * block_size + min(max(rest - shard_index * block_size, 0), block_size)
+
+def shard_file_stem(shard_index, shard_count):
+    return f"shard_{shard_index:03d}_of_{shard_count:03d}"
+
+class ShardManifest:
+    """Partial output files of one shard and the offsets of its blocks"""
     
-    # Get instance URL and access token
-    instance_url = auth_info['instance_url']
-    access_token = auth_info['access_token']
+    def __init__(self, output_dir, shard_index, shard_count, export_format, block_size=SHARD_BLOCK_SIZE):
+        stem = shard_file_stem(shard_index, shard_count)
+        extension = EXPORTERS[export_format].extension
+        self.path = os.path.join(output_dir, f"salesforce_{stem}.json")
+        self.account_filename = os.path.join(output_dir, f"salesforce_companies_{stem}{extension}")
+        self.contact_filename = os.path.join(output_dir, f"salesforce_contacts_{stem}{extension}")
+        self.entry = {
+            'shard_index': shard_index,
+            'shard_count': shard_count,
+            'format': export_format,
+            'block_size': block_size,
+            'fields': field_projection.as_dict(),
+            'account_file': os.path.basename(self.account_filename),
+            'contact_file': os.path.basename(self.contact_filename),
+            'offsets': [],
+            'has_contacts': False
+        }
+        self._pending = 0
     
-    # API endpoint
-    api_url = f"{instance_url}/services/data/v60.0/query/"
+    def start(self, exporter):
+        """Note where the first block starts (after any header)"""
+        exporter.flush()
+        self.entry['offsets'].append(list(exporter.offsets()))
     
-    # SOQL query for contacts
-    query = (
-        "SELECT Id, Name, Title, Email, Phone, Department "
-        "FROM Contact "
-        f"WHERE AccountId = '{account_id}'"
-    )
+    def record(self, exporter):
+        """Count one searched name, closing the block when it is full"""
+        self._pending += 1
+        if self._pending >= self.entry['block_size']:
+            self.end_block(exporter)
     
-    # Request headers
-    headers = {
-        'Authorization': f"Bearer {access_token}",
-        'Content-Type': 'application/json'
-    }
+    def end_block(self, exporter):
+        if not self._pending:
+            return
+        exporter.flush()
+        self.entry['offsets'].append(list(exporter.offsets()))
+        self._pending = 0
     
-    # GET request to fetch data
-    try:
-        response = requests.get(api_url, headers=headers, params={'q': query})
-        
-        if response.status_code == 200:
-            results = response.json()['records']
-            return results
-        else:
-            print(f"Contact API call error: {response.status_code}")
-            print(response.text)
-            return []
-    except Exception as e:
-        print(f"Contact info retrieval error: {e}")
-        return []
+    def finish(self, exporter):
+        """Close the last block and write the manifest the merge step reads"""
+        self.end_block(exporter)
+        self.entry['has_contacts'] = exporter.has_contacts
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entry, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
 
-def format_address(account):
-    """Format address information"""
-    address_parts = []
+def copy_file_range(source, target, start, end):
+    """Append bytes [start, end) of an open file to another"""
+    source.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        data = source.read(min(SHARD_COPY_CHUNK, remaining))
+        if not data:
+            break
+        target.write(data)
+        remaining -= len(data)
+
+def load_shard_manifests(directory):
+    """Finished shard manifests in a directory, ordered by shard; raises ValueError if incomplete"""
+    manifests = []
+    for path in sorted(Path(directory).glob('salesforce_shard_*_of_*.json')):
+        with open(path, 'r', encoding='utf-8') as f:
+            manifests.append(json.load(f))
     
-    # Add address components if they exist
-    if account.get('BillingPostalCode'):
-        address_parts.append(account['BillingPostalCode'])
+    if not manifests:
+        raise ValueError(f"no shard manifests in {directory or '.'}")
     
-    if account.get('BillingCountry'):
-        address_parts.append(account['BillingCountry'])
-        
-    if account.get('BillingState'):
-        address_parts.append(account['BillingState'])
-        
-    if account.get('BillingCity'):
-        address_parts.append(account['BillingCity'])
-        
-    if account.get('BillingStreet'):
-        address_parts.append(account['BillingStreet'])
+    shard_count = manifests[0]['shard_count']
+    found = sorted(manifest['shard_index'] for manifest in manifests if manifest['shard_count'] == shard_count)
+    missing = sorted(set(range(shard_count)) - set(found))
+    if missing or len(manifests) != shard_count:
+        raise ValueError(f"shards missing or from another run: expected {shard_count}, missing {missing}")
     
-    # Join address components
-    return " ".join(address_parts) if address_parts else "No address available"
-
-def display_results(auth_info, results, company_name=""):
-    """Display search results"""
-    total_accounts = len(results)
+    settings = {(manifest['format'], manifest['block_size'], json.dumps(manifest['fields'])) for manifest in manifests}
+    if len(settings) > 1:
+        raise ValueError("shards were run with different formats, block sizes or fields")
     
-    # List to store all company data
-    all_company_data = []
+    return sorted(manifests, key=lambda manifest: manifest['shard_index'])
+
+def merge_shards(directory):
+    """Merge finished shard files into the standard export files, in input order"""
+    manifests = load_shard_manifests(directory)
+    shard_count = len(manifests)
+    exporter = EXPORTERS[manifests[0]['format']](output_dir=directory)
+    has_contacts = any(manifest['has_contacts'] for manifest in manifests)
     
-    if company_name:
-        print(f"\nSearch results for company name \"{company_name}\":")
-    print(f"Number of accounts found: {total_accounts}")
+    outputs = [('account_file', 0, exporter.account_filename)]
+    if has_contacts:
+        outputs.append(('contact_file', 1, exporter.contact_filename))
     
-    if total_accounts > 0:
-        for i, account in enumerate(results, 1):
-            print(f"\n===== Account {i} =====")
-            print(f"Account ID: {account['Id']}")
-            print(f"Company Name: {account['Name']}")
-            print(f"Address: {format_address(account)}")
-            
-            if account.get('Phone'):
-                print(f"Phone: {account['Phone']}")
-            
-            if account.get('Website'):
-                print(f"Website: {account.get('Website')}")
-                
-            if account.get('Industry'):
-                print(f"Industry: {account.get('Industry')}")
-                
-            if account.get('NumberOfEmployees'):
-                print(f"Number of Employees: {account.get('NumberOfEmployees')}")
+    for file_key, column, target_path in outputs:
+        sources = [open(os.path.join(directory, manifest[file_key]), 'rb') for manifest in manifests]
+        try:
+            with open(target_path, 'wb') as target:
+                # The header (if the format has one) comes from the first shard
+                copy_file_range(sources[0], target, 0, manifests[0]['offsets'][0][column])
                 
-            if account.get('Description'):
-                print(f"Description: {account.get('Description')}")
-            
-            # Get related contacts
-            contacts = get_contacts(auth_info, account['Id'])
-            
-            # Store account data
-            account_data = {
-                'SearchKeyword': company_name,
-                'SFStatus': 'Found in Salesforce',
-                'AccountId': account['Id'],
-                'AccountName': account['Name'],
-                'AccountAddress': format_address(account),
-                'AccountPhone': account.get('Phone', ''),
-                'Website': account.get('Website', ''),
-                'Industry': account.get('Industry', ''),
-                'NumberOfEmployees': account.get('NumberOfEmployees', ''),
-                'Description': account.get('Description', '')
-            }
-            
-            # If no contacts, still add the account data
-            if not contacts:
-                print("\n  No related contacts found.")
-                all_company_data.append(account_data)
-            else:
-                print(f"\n  === Related Contacts ({len(contacts)} found) ===")
-                
-                for j, contact in enumerate(contacts, 1):
-                    print(f"\n  --- Contact {j} ---")
-                    print(f"  Contact ID: {contact['Id']}")
-                    print(f"  Name: {contact.get('Name', 'N/A')}")
-                    print(f"  Title: {contact.get('Title', 'N/A')}")
-                    print(f"  Email: {contact.get('Email', 'N/A')}")
-                    print(f"  Phone: {contact.get('Phone', 'N/A')}")
-                    print(f"  Department: {contact.get('Department', 'N/A')}")
-                    
-                    # Create a copy of account data with contact info
-                    contact_data = account_data.copy()
-                    contact_data.update({
-                        'ContactId': contact['Id'],
-                        'ContactName': contact.get('Name', ''),
-                        'ContactTitle': contact.get('Title', ''),
-                        'ContactEmail': contact.get('Email', ''),
-                        'ContactPhone': contact.get('Phone', ''),
-                        'ContactDepartment': contact.get('Department', '')
-                    })
-                    all_company_data.append(contact_data)
-    else:
-        print("No company information found.")
-        # Add dummy data for not found companies
-        if company_name:
-            not_found_data = {
-                'SearchKeyword': company_name,
-                'SFStatus': 'Not found in Salesforce',
-                'AccountId': 'Not in Salesforce',
-                'AccountName': '',
-                'AccountAddress': '',
-                'AccountPhone': '',
-                'Website': '',
-                'Industry': '',
-                'NumberOfEmployees': '',
-                'Description': ''
-            }
-            all_company_data.append(not_found_data)
+                # Block b of the input is block b // shard_count of shard
+                # b % shard_count; the first missing block ends the input
+                block = 0
+                while True:
+                    shard = block % shard_count
+                    offsets = manifests[shard]['offsets']
+                    local = block // shard_count
+                    if local + 1 >= len(offsets):
+                        break
+                    copy_file_range(sources[shard], target, offsets[local][column], offsets[local + 1][column])
+                    block += 1
+        finally:
+            for source in sources:
+                source.close()
     
-    return all_company_data
+    print(f"\nMerged {shard_count} shards into {exporter.label} file: {exporter.account_filename}")
+    if has_contacts:
+        print(f"Merged {shard_count} shards into {exporter.label} file: {exporter.contact_filename}")
+    
+    # The partial files are fully contained in the merged ones
+    for manifest in manifests:
+        stem = shard_file_stem(manifest['shard_index'], manifest['shard_count'])
+        for name in (manifest['account_file'], manifest['contact_file'], f"salesforce_{stem}.json"):
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                os.remove(path)
 
 def export_to_csv(all_results, all_company_data):
     """Export search results to CSV file"""
@@ -263,119 +3160,22 @@ def export_to_csv(all_results, all_company_data):
         print("No data to export.")
         return
     
-    # Get current timestamp for filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
-    # 1. Export account information to CSV
-    account_filename = f"salesforce_companies_{timestamp}.csv"
-    
+    started = time.perf_counter()
     try:
-        with open(account_filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            # Define CSV header
-            fieldnames = [
-                'Search Keyword', 'Salesforce ID', 'Company Name', 
-                'Postal Code', 'Full Address', 'Phone', 'Website', 
-                'Industry', 'Number of Employees', 'Description'
-            ]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            
-            # Write information for each search result
-            for idx, (company_name, results) in enumerate(all_results):
-                if not results:
-                    # Add empty row for companies not found
-                    writer.writerow({
-                        'Search Keyword': company_name,
-                        'Salesforce ID': 'Not in Salesforce',
-                        'Company Name': '',
-                        'Postal Code': '',
-                        'Full Address': '',
-                        'Phone': '',
-                        'Website': '',
-                        'Industry': '',
-                        'Number of Employees': '',
-                        'Description': ''
-                    })
-                else:
-                    # Add data for each account found
-                    for account in results:
-                        # Get postal code
-                        postal_code = account.get('BillingPostalCode', '')
-                        
-                        # Format address
-                        address_parts = []
-                        if account.get('BillingCountry'):
-                            address_parts.append(account['BillingCountry'])
-                        if account.get('BillingState'):
-                            address_parts.append(account['BillingState'])
-                        if account.get('BillingCity'):
-                            address_parts.append(account['BillingCity'])
-                        if account.get('BillingStreet'):
-                            address_parts.append(account['BillingStreet'])
-                        address = " ".join(address_parts) if address_parts else ""
-                        
-                        # Write to CSV
-                        writer.writerow({
-                            'Search Keyword': company_name,
-                            'Salesforce ID': account['Id'],
-                            'Company Name': account.get('Name', ''),
-                            'Postal Code': postal_code,
-                            'Full Address': address,
-                            'Phone': account.get('Phone', ''),
-                            'Website': account.get('Website', ''),
-                            'Industry': account.get('Industry', ''),
-                            'Number of Employees': account.get('NumberOfEmployees', ''),
-                            'Description': account.get('Description', '')
-                        })
-            
-        print(f"\nExported company information to CSV file: {account_filename}")
-        
-        # 2. Export contact information to CSV
-        # Only output if we have contact data
-        if any('ContactId' in data for data in all_company_data):
-            contact_filename = f"salesforce_contacts_{timestamp}.csv"
-            
-            with open(contact_filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
-                # Define CSV header with both account and contact fields
-                fieldnames = [
-                    'Search Keyword', 'Salesforce Status',
-                    'Account ID', 'Company Name', 'Company Address', 'Company Phone', 
-                    'Website', 'Industry', 'Number of Employees', 'Description',
-                    'Contact ID', 'Contact Name', 'Title', 'Contact Email', 
-                    'Contact Phone', 'Department'
-                ]
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                
-                # Write each contact record
-                for data in all_company_data:
-                    row_data = {
-                        'Search Keyword': data.get('SearchKeyword', ''),
-                        'Salesforce Status': data.get('SFStatus', ''),
-                        'Account ID': data.get('AccountId', ''),
-                        'Company Name': data.get('AccountName', ''),
-                        'Company Address': data.get('AccountAddress', ''),
-                        'Company Phone': data.get('AccountPhone', ''),
-                        'Website': data.get('Website', ''),
-                        'Industry': data.get('Industry', ''),
-                        'Number of Employees': data.get('NumberOfEmployees', ''),
-                        'Description': data.get('Description', ''),
-                        'Contact ID': data.get('ContactId', ''),
-                        'Contact Name': data.get('ContactName', ''),
-                        'Title': data.get('ContactTitle', ''),
-                        'Contact Email': data.get('ContactEmail', ''),
-                        'Contact Phone': data.get('ContactPhone', ''),
-                        'Department': data.get('ContactDepartment', '')
-                    }
-                    writer.writerow(row_data)
-                
-            print(f"Exported contact information to CSV file: {contact_filename}")
+        with CsvExporter() as exporter:
+            # Company rows per keyword, then every contact row in order
+            for company_name, results in all_results:
+                exporter.write_companies(company_name, results)
+            exporter.write_contacts(all_company_data)
     except Exception as e:
         print(f"Error exporting to CSV: {e}")
+    finally:
+        run_metrics.add_time('export', time.perf_counter() - started)
 
-def load_config():
+def load_config(interactive=True):
     """Load configuration from config file or environment variables"""
     # First try to load from .env file
+    from dotenv import load_dotenv
     load_dotenv()
     
     # Check environment variables first
@@ -386,10 +3186,11 @@ def load_config():
     
     # If any of the credentials are missing, try config file
     if not all([username, password, client_id, client_secret]):
-        config = configparser.ConfigParser()
         config_path = Path('config.ini')
         
         if config_path.exists():
+            import configparser
+            config = configparser.ConfigParser()
             config.read(config_path)
             if 'Salesforce' in config:
                 sf_config = config['Salesforce']
@@ -398,6 +3199,15 @@ def load_config():
                 client_id = client_id or sf_config.get('client_id')
                 client_secret = client_secret or sf_config.get('client_secret')
     
+    # Unattended runs can't prompt; leave the missing values empty
+    if not interactive:
+        return {
+            'username': username,
+            'password': password,
+            'client_id': client_id,
+            'client_secret': client_secret
+        }
+    
     # If still missing credentials, prompt user
     if not username:
         username = input("Enter Salesforce username: ").strip()
@@ -419,202 +3229,843 @@ def load_config():
         'client_secret': client_secret
     }
 
-def main():
-    """Main function"""
-    # Set default language to English
+def load_field_config(args):
+    """Configured Account/Contact field lists: command line, then environment, then config.ini"""
+    account_fields = args.account_fields or os.environ.get('SALESFORCE_ACCOUNT_FIELDS')
+    contact_fields = args.contact_fields or os.environ.get('SALESFORCE_CONTACT_FIELDS')
+    
+    config_path = Path('config.ini')
+    if not (account_fields and contact_fields) and config_path.exists():
+        import configparser
+        config = configparser.ConfigParser()
+        config.read(config_path)
+        if 'Fields' in config:
+            account_fields = account_fields or config['Fields'].get('account')
+            contact_fields = contact_fields or config['Fields'].get('contact')
+    
+    return (
+        parse_field_list(account_fields) if account_fields else None,
+        parse_field_list(contact_fields) if contact_fields else None
+    )
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(
+        description="Salesforce Company Search Tool. Runs interactively unless "
+                    "--input or --names is given."
+    )
+    parser.add_argument(
+        '--mode', choices=['partial', 'exact'],
+        help="Search mode (default: partial, or ask interactively)"
+    )
+    parser.add_argument(
+        '--input', metavar='CSV',
+        help="CSV file with company names in the first column (runs without prompts)"
+    )
+    parser.add_argument(
+        '--column', metavar='HEADER',
+        help="Read company names from the CSV column with this header instead of the first column"
+    )
+    parser.add_argument(
+        '--names',
+        help="Comma-separated company names to search (runs without prompts)"
+    )
+    parser.add_argument(
+        '--output-dir', default='',
+        help="Directory for the exported files (default: current directory)"
+    )
+    parser.add_argument(
+        '--format', choices=list(EXPORTERS), default='csv',
+        help="Export file format: csv, gzip or zstd compressed JSON lines, "
+             "or Parquet (default: csv)"
+    )
+    parser.add_argument(
+        '--console', choices=sorted(RENDERERS), default='verbose',
+        help="Console output: every account and contact (verbose), a progress "
+             "line (progress), one JSON object per row (jsonl) or nothing (silent)"
+    )
+    parser.add_argument(
+        '--no-console', action='store_true',
+        help="Same as --console silent"
+    )
+    parser.add_argument(
+        '--concurrency', type=int, default=1,
+        help="Number of company searches to run in parallel (default: 1)"
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=QUERY_BATCH_SIZE,
+        help=f"Records per query page, 200-2000 (default: {QUERY_BATCH_SIZE})"
+    )
+    parser.add_argument(
+        '--max-rate', type=float,
+        help="Maximum API requests per second across all workers (default: unlimited)"
+    )
+    parser.add_argument(
+        '--api-reserve', type=float, default=API_RESERVE_PERCENT, metavar='PERCENT',
+        help="Percent of the org's daily API requests to leave unused; the run slows "
+             f"down and then pauses as it gets close (default: {API_RESERVE_PERCENT:g})"
+    )
+    parser.add_argument(
+        '--limits-poll', type=float, metavar='SECONDS',
+        help="Also check /limits every SECONDS (usage is otherwise read from response headers)"
+    )
+    parser.add_argument(
+        '--backend', choices=['soql', 'sosl', 'index'], default='soql',
+        help="How partial names are matched: SOQL LIKE, the SOSL search index, "
+             "or a local Account name index (default: soql)"
+    )
+    parser.add_argument(
+        '--compare-backends', action='store_true',
+        help="Also time the SOSL/SOQL backend not in use and print a latency comparison"
+    )
+    parser.add_argument(
+        '--name-index', default=NAME_INDEX_PATH,
+        help=f"Account name index file for --backend index (default: {NAME_INDEX_PATH})"
+    )
+    parser.add_argument(
+        '--fuzzy', action='store_true',
+        help="With --backend index, rank similar names instead of requiring a substring match"
+    )
+    parser.add_argument(
+        '--composite', action='store_true',
+        help=f"Send up to {COMPOSITE_BATCH_SIZE} company searches per request via the Composite Batch API"
+    )
+    parser.add_argument(
+        '--snapshot', action='store_true',
+        help="Export all Accounts/Contacts with Bulk API 2.0 and match names locally"
+    )
+    parser.add_argument(
+        '--snapshot-dir', default=SNAPSHOT_DIR,
+        help=f"Directory for the Bulk API result files (default: {SNAPSHOT_DIR})"
+    )
+    parser.add_argument(
+        '--account-fields', metavar='FIELDS',
+        help="Comma-separated Account fields to fetch instead of the defaults, e.g. to drop "
+             "Description or add custom __c fields (Id and Name are always fetched)"
+    )
+    parser.add_argument(
+        '--contact-fields', metavar='FIELDS',
+        help="Comma-separated Contact fields to fetch instead of the defaults (Id is always fetched)"
+    )
+    parser.add_argument(
+        '--describe-cache', default=DESCRIBE_CACHE_PATH,
+        help=f"Cached describe results used to check configured fields (default: {DESCRIBE_CACHE_PATH})"
+    )
+    parser.add_argument(
+        '--describe-ttl', type=float, default=DESCRIBE_TTL_HOURS,
+        help=f"Hours before cached describe results are refreshed (default: {DESCRIBE_TTL_HOURS})"
+    )
+    parser.add_argument(
+        '--sync', action='store_true',
+        help="Only fetch accounts and contacts changed since the last --sync run and "
+             "also write a CSV of the changed records"
+    )
+    parser.add_argument(
+        '--sync-store', default=SYNC_STORE_PATH,
+        help=f"Local store of the last synced export used by --sync (default: {SYNC_STORE_PATH})"
+    )
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help="Split the input across this many processes, each with its own session, "
+             "and merge their files in input order (default: 1)"
+    )
+    parser.add_argument(
+        '--shard-index', type=int, metavar='INDEX',
+        help="Only search shard INDEX (0-based) of --shard-count and write partial files "
+             "for --merge-shards, e.g. to spread one job over several machines"
+    )
+    parser.add_argument(
+        '--shard-count', type=int, metavar='COUNT',
+        help=f"Number of shards; the input is dealt out in blocks of {SHARD_BLOCK_SIZE} names"
+    )
+    parser.add_argument(
+        '--merge-shards', metavar='DIR',
+        help="Merge the finished shard files in DIR into the standard export files and exit"
+    )
+    parser.add_argument(
+        '--resume', action='store_true',
+        help="Continue an interrupted export, skipping keywords already written"
+    )
+    parser.add_argument(
+        '--checkpoint', default=CHECKPOINT_PATH,
+        help=f"Checkpoint journal used by --resume (default: {CHECKPOINT_PATH})"
+    )
+    parser.add_argument(
+        '--cache', action='store_true',
+        help="Reuse query results from the local cache between runs"
+    )
+    parser.add_argument(
+        '--cache-path', default=CACHE_PATH,
+        help=f"Cache database file (default: {CACHE_PATH})"
+    )
+    parser.add_argument(
+        '--cache-ttl', type=float, default=CACHE_TTL_HOURS,
+        help=f"Hours before a cached result expires (default: {CACHE_TTL_HOURS})"
+    )
+    parser.add_argument(
+        '--cache-size', type=int, default=CACHE_MAX_ENTRIES,
+        help=f"Maximum cached results before least recently used are evicted (default: {CACHE_MAX_ENTRIES})"
+    )
+    parser.add_argument(
+        '--token-cache', default=TOKEN_CACHE_PATH,
+        help=f"File the access token is cached in between runs, readable only by you (default: {TOKEN_CACHE_PATH})"
+    )
+    parser.add_argument(
+        '--no-token-cache', action='store_true',
+        help="Log in on every run instead of reusing a cached access token"
+    )
+    parser.add_argument(
+        '--timing', action='store_true',
+        help="Print how long startup took up to the login and the first result"
+    )
+    parser.add_argument(
+        '--metrics-file', metavar='PATH',
+        help="Write API call and timing metrics to PATH: Prometheus text format "
+             "for a .prom file (node_exporter textfile collector), JSON otherwise"
+    )
+    parser.add_argument(
+        '--profile', metavar='PATH',
+        help="Profile the run with cProfile and write the stats to PATH "
+             "(only the main thread is profiled; combine with --concurrency 1)"
+    )
+    args = parser.parse_args(argv)
+    
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if not 200 <= args.batch_size <= 2000:
+        parser.error("--batch-size must be between 200 and 2000")
+    if args.max_rate is not None and args.max_rate <= 0:
+        parser.error("--max-rate must be greater than 0")
+    if not 0 <= args.api_reserve < 100:
+        parser.error("--api-reserve must be between 0 and 100")
+    if args.fuzzy and args.backend != 'index':
+        parser.error("--fuzzy requires --backend index")
+    if args.input is not None and args.names is not None:
+        parser.error("use either --input or --names, not both")
+    if args.column and args.input is None:
+        parser.error("--column requires --input")
+    if args.sync and (args.resume or args.snapshot):
+        parser.error("--sync can't be combined with --resume or --snapshot")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if (args.shard_index is None) != (args.shard_count is None):
+        parser.error("--shard-index and --shard-count must be given together")
+    if args.shard_count is not None and not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard-index must be between 0 and --shard-count - 1")
+    
+    exporter_class = EXPORTERS[args.format]
+    if exporter_class.requires and importlib.util.find_spec(exporter_class.requires) is None:
+        parser.error(f"--format {args.format} requires the {exporter_class.requires} package")
+    if args.resume and not exporter_class.resumable:
+        parser.error(f"--resume is not supported with --format {args.format}")
+    
+    # Sharded runs split the work by input position and merge files by offset
+    if args.workers > 1 or args.shard_count:
+        option = '--workers' if args.workers > 1 else '--shard-count'
+        if args.workers > 1 and args.shard_count:
+            parser.error("use either --workers or --shard-index/--shard-count, not both")
+        if args.input is None and args.names is None:
+            parser.error(f"{option} requires --input or --names")
+        if args.resume or args.sync:
+            parser.error(f"{option} can't be combined with --resume or --sync")
+        # These match locally after one full download or index build; every
+        # shard would repeat it and write the same files at the same time
+        if args.snapshot or args.backend == 'index':
+            parser.error(f"{option} can't be combined with --snapshot or --backend index")
+        if not exporter_class.resumable:
+            parser.error(f"{option} is not supported with --format {args.format}")
+        if args.profile and args.workers > 1:
+            parser.error("--profile can't be combined with --workers")
+    
+    return args
+
+# Process exit codes
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_AUTH_FAILED = 3
+EXIT_INPUT_ERROR = 4
+EXIT_API_BUDGET = 5
+EXIT_INTERRUPTED = 130
+
+# Messages in both languages
+MESSAGES = {
+    'title': {
+        'en': "Salesforce Company Search Tool",
+        'ja': "Salesforce 企業検索ツール"
+    },
+    'connecting': {
+        'en': "Connecting to Salesforce...",
+        'ja': "Salesforceに接続しています..."
+    },
+    'auth_success': {
+        'en': "Authentication successful!",
+        'ja': "認証成功！"
+    },
+    'instance_url': {
+        'en': "Instance URL",
+        'ja': "インスタンスURL"
+    },
+    'select_search_mode': {
+        'en': "Select search mode:",
+        'ja': "検索モードを選択してください:"
+    },
+    'partial_match': {
+        'en': "Partial match (company name contains search term)",
+        'ja': "部分一致（会社名に検索語が含まれる）"
+    },
+    'exact_match': {
+        'en': "Exact match (company name equals search term)",
+        'ja': "完全一致（会社名が検索語と一致する）"
+    },
+    'select_prompt': {
+        'en': "Select (1 or 2)",
+        'ja': "選択してください (1 または 2)"
+    },
+    'invalid_selection': {
+        'en': "Invalid selection. Please select 1 or 2.",
+        'ja': "無効な選択です。1または2を選択してください。"
+    },
+    'select_input_method': {
+        'en': "Select company name input method:",
+        'ja': "会社名の入力方法を選択してください:"
+    },
+    'direct_input': {
+        'en': "Direct input (comma-separated for multiple names)",
+        'ja': "直接入力（複数の名前はカンマ区切り）"
+    },
+    'load_csv': {
+        'en': "Load from CSV file",
+        'ja': "CSVファイルから読み込む"
+    },
+    'enter_company_names': {
+        'en': "Enter company name(s) to search (separate multiple names with commas):",
+        'ja': "検索する会社名を入力してください（複数の場合はカンマで区切る）:"
+    },
+    'company_names_prompt': {
+        'en': "Company name(s)",
+        'ja': "会社名"
+    },
+    'enter_csv_path': {
+        'en': "Enter the path to your CSV file (e.g., C:\\Users\\username\\companies.csv):",
+        'ja': "CSVファイルのパスを入力してください（例：C:\\Users\\username\\companies.csv）:"
+    },
+    'file_path_prompt': {
+        'en': "File path",
+        'ja': "ファイルパス"
+    },
+    'file_not_found': {
+        'en': "File not found",
+        'ja': "ファイルが見つかりません"
+    },
+    'no_valid_names': {
+        'en': "No valid company names entered.",
+        'ja': "有効な会社名が入力されていません。"
+    },
+    'searching_for': {
+        'en': "Searching for company",
+        'ja': "会社を検索中"
+    },
+    'export_to_csv': {
+        'en': "Export results to CSV file? (y/n)",
+        'ja': "結果をCSVファイルにエクスポートしますか？ (y/n)"
+    },
+    'no_results': {
+        'en': "No results found for any company name.",
+        'ja': "どの会社名でも結果が見つかりませんでした。"
+    },
+    'search_stopped': {
+        'en': "Search stopped after a connection or authentication error; rerun with --resume to continue from",
+        'ja': "接続または認証のエラーで検索を停止しました。--resume で再実行すると次から続行します"
+    },
+    'lookups_failed': {
+        'en': "Lookups failed after retries",
+        'ja': "再試行後も失敗した検索"
+    },
+    'retry_failed': {
+        'en': "Their names were not exported; rerun with --resume to retry them",
+        'ja': "これらの会社名は出力されていません。--resume で再実行すると再試行します"
+    },
+    'failed_not_found': {
+        'en': "Their names were written as not found",
+        'ja': "これらの会社名は該当なしとして出力されています"
+    },
+    'retrying_failed': {
+        'en': "Names that failed last time and are retried",
+        'ja': "前回失敗したため再試行する会社名"
+    },
+    'auth_failed': {
+        'en': "Authentication failed. Please check your credentials.",
+        'ja': "認証に失敗しました。認証情報を確認してください。"
+    },
+    'resuming': {
+        'en': "Resuming previous run; searches already completed",
+        'ja': "前回の実行を再開します。完了済みの検索数"
+    },
+    'resume_mode_mismatch': {
+        'en': "Using the search mode of the run being resumed",
+        'ja': "再開する実行の検索モードを使用します"
+    },
+    'resume_fields_mismatch': {
+        'en': "Using the fields of the run being resumed",
+        'ja': "再開する実行の項目を使用します"
+    },
+    'unknown_fields': {
+        'en': "Unknown fields",
+        'ja': "存在しない項目"
+    },
+    'no_checkpoint': {
+        'en': "No checkpoint found, starting a new run.",
+        'ja': "チェックポイントが見つからないため、新規に実行します。"
+    },
+    'missing_credentials': {
+        'en': "Salesforce credentials are missing. Set them in the environment, .env or config.ini.",
+        'ja': "Salesforceの認証情報がありません。環境変数、.envまたはconfig.iniで設定してください。"
+    }
+}
+
+def msg(key):
+    """Get a message in the user's language (from LANG, default English)"""
     language = os.environ.get('LANG', 'en').lower()
     japanese = language.startswith('ja') or 'japanese' in language
+    return MESSAGES[key]['ja' if japanese else 'en']
+
+def prompt_search_mode():
+    """Ask for the search mode; returns None on an invalid choice"""
+    print(f"\n{msg('select_search_mode')}")
+    print(f"1: {msg('partial_match')}")
+    print(f"2: {msg('exact_match')}")
+    search_mode = input(f"{msg('select_prompt')}: ").strip()
     
-    # Messages in both languages
-    messages = {
-        'title': {
-            'en': "Salesforce Company Search Tool",
-            'ja': "Salesforce 企業検索ツール"
-        },
-        'connecting': {
-            'en': "Connecting to Salesforce...",
-            'ja': "Salesforceに接続しています..."
-        },
-        'auth_success': {
-            'en': "Authentication successful!",
-            'ja': "認証成功！"
-        },
-        'instance_url': {
-            'en': "Instance URL",
-            'ja': "インスタンスURL"
-        },
-        'select_search_mode': {
-            'en': "Select search mode:",
-            'ja': "検索モードを選択してください:"
-        },
-        'partial_match': {
-            'en': "Partial match (company name contains search term)",
-            'ja': "部分一致（会社名に検索語が含まれる）"
-        },
-        'exact_match': {
-            'en': "Exact match (company name equals search term)",
-            'ja': "完全一致（会社名が検索語と一致する）"
-        },
-        'select_prompt': {
-            'en': "Select (1 or 2)",
-            'ja': "選択してください (1 または 2)"
-        },
-        'invalid_selection': {
-            'en': "Invalid selection. Please select 1 or 2.",
-            'ja': "無効な選択です。1または2を選択してください。"
-        },
-        'select_input_method': {
-            'en': "Select company name input method:",
-            'ja': "会社名の入力方法を選択してください:"
-        },
-        'direct_input': {
-            'en': "Direct input (comma-separated for multiple names)",
-            'ja': "直接入力（複数の名前はカンマ区切り）"
-        },
-        'load_csv': {
-            'en': "Load from CSV file",
-            'ja': "CSVファイルから読み込む"
-        },
-        'enter_company_names': {
-            'en': "Enter company name(s) to search (separate multiple names with commas):",
-            'ja': "検索する会社名を入力してください（複数の場合はカンマで区切る）:"
-        },
-        'company_names_prompt': {
-            'en': "Company name(s)",
-            'ja': "会社名"
-        },
-        'enter_csv_path': {
-            'en': "Enter the path to your CSV file (e.g., C:\\Users\\username\\companies.csv):",
-            'ja': "CSVファイルのパスを入力してください（例：C:\\Users\\username\\companies.csv）:"
-        },
-        'file_path_prompt': {
-            'en': "File path",
-            'ja': "ファイルパス"
-        },
-        'file_not_found': {
-            'en': "File not found",
-            'ja': "ファイルが見つかりません"
-        },
-        'no_valid_names': {
-            'en': "No valid company names entered.",
-            'ja': "有効な会社名が入力されていません。"
-        },
-        'searching_for': {
-            'en': "Searching for company",
-            'ja': "会社を検索中"
-        },
-        'export_to_csv': {
-            'en': "Export results to CSV file? (y/n)",
-            'ja': "結果をCSVファイルにエクスポートしますか？ (y/n)"
-        },
-        'no_results': {
-            'en': "No results found for any company name.",
-            'ja': "どの会社名でも結果が見つかりませんでした。"
-        },
-        'auth_failed': {
-            'en': "Authentication failed. Please check your credentials.",
-            'ja': "認証に失敗しました。認証情報を確認してください。"
-        }
-    }
+    if search_mode not in ["1", "2"]:
+        print(f"{msg('invalid_selection')}")
+        return None
     
-    # Helper function to get message in correct language
-    def msg(key):
-        lang = 'ja' if japanese else 'en'
-        return messages[key][lang]
+    return "partial" if search_mode == "1" else "exact"
+
+def prompt_company_names():
+    """Ask for company names directly or from a CSV file"""
+    print(f"\n{msg('select_input_method')}")
+    print(f"1: {msg('direct_input')}")
+    print(f"2: {msg('load_csv')}")
+    input_method = input(f"{msg('select_prompt')}: ").strip()
     
-    print(msg('title'))
-    print("-" * len(msg('title')))
+    if input_method == "1":
+        # Direct input
+        print(f"\n{msg('enter_company_names')}")
+        return split_company_names(input(f"{msg('company_names_prompt')}: "))
     
-    # Load configuration
-    config = load_config()
+    if input_method == "2":
+        # Load from CSV file
+        print(f"\n{msg('enter_csv_path')}")
+        csv_path = input(f"{msg('file_path_prompt')}: ").strip()
+        
+        # Remove quotes from path (in case user copy-pasted with quotes)
+        return load_company_names(csv_path.strip('"\''))
     
-    print(f"\n{msg('connecting')}")
-    auth_info = get_salesforce_oauth_token(
-        config['username'], 
-        config['password'], 
-        config['client_id'], 
-        config['client_secret']
-    )
+    print(f"{msg('invalid_selection')}")
+    return None
+
+def split_company_names(text):
+    """Split comma-separated company names and remove whitespace"""
+    return [name.strip() for name in text.split(',') if name.strip()]
+
+def load_company_names(csv_path, column=None):
+    """Stream company names from a CSV file; returns None if it can't be read"""
+    if not os.path.exists(csv_path):
+        print(f"{msg('file_not_found')}: {csv_path}")
+        return None
+    return read_company_names_from_csv(csv_path, column)
+
+def run_search(client, company_names, search_mode, args, export=True, console=None, total=None):
+    """Search every company, display and export the results; returns an exit code"""
+    exporter = None
+    journal = None
+    shard = None
+    if hasattr(company_names, '__len__'):
+        total = len(company_names)
     
-    if auth_info:
-        print(f"{msg('auth_success')}")
-        print(f"{msg('instance_url')}: {auth_info['instance_url']}")
-        
-        # Choose search mode
-        print(f"\n{msg('select_search_mode')}")
-        print(f"1: {msg('partial_match')}")
-        print(f"2: {msg('exact_match')}")
-        search_mode = input(f"{msg('select_prompt')}: ").strip()
-        
-        if search_mode not in ["1", "2"]:
-            print(f"{msg('invalid_selection')}")
-            return
+    if args.shard_count:
+        # Only this shard's blocks of the input; the rows go to partial
+        # files that merge_shards puts back in input order
+        company_names = shard_names(company_names, args.shard_index, args.shard_count)
+        if total is not None:
+            total = shard_name_count(total, args.shard_index, args.shard_count)
+        shard = ShardManifest(args.output_dir, args.shard_index, args.shard_count, args.format)
+        exporter = EXPORTERS[args.format](
+            account_filename=shard.account_filename, contact_filename=shard.contact_filename
+        ).open()
+        shard.start(exporter)
+    elif export and not EXPORTERS[args.format].resumable:
+        exporter = EXPORTERS[args.format](output_dir=args.output_dir).open()
+    elif export:
+        # Journal completed keywords so an interrupted run can be resumed
+        journal = CheckpointJournal(args.checkpoint)
         
-        search_mode_value = "partial" if search_mode == "1" else "exact"
-        
-        # Choose input method
-        print(f"\n{msg('select_input_method')}")
-        print(f"1: {msg('direct_input')}")
-        print(f"2: {msg('load_csv')}")
-        input_method = input(f"{msg('select_prompt')}: ").strip()
-        
-        company_names = []
-        
-        if input_method == "1":
-            # Direct input
-            print(f"\n{msg('enter_company_names')}")
-            company_names_input = input(f"{msg('company_names_prompt')}: ").strip()
+        if args.resume and journal.load():
+            print(f"\n{msg('resuming')}: {sum(journal.completed.values())}")
+            if journal.failed:
+                print(f"{msg('retrying_failed')}: {len(journal.failed)}")
+            if journal.run['search_mode'] != search_mode:
+                print(f"{msg('resume_mode_mismatch')}: {journal.run['search_mode']}")
+                search_mode = journal.run['search_mode']
+            
+            # The files already have the interrupted run's columns
+            fields = journal.run.get('fields')
+            if fields and fields != field_projection.as_dict():
+                print(msg('resume_fields_mismatch'))
+                field_projection.configure(**fields)
+            
+            # Keep writing the format the interrupted run started with
+            exporter = EXPORTERS[journal.run.get('format', 'csv')](
+                on_flush=journal.commit,
+                account_filename=journal.run['account_file'],
+                contact_filename=journal.run['contact_file']
+            )
+            exporter.has_contacts = journal.has_contacts
+            exporter.open(resume_offsets=journal.offsets)
+            journal.reopen()
+            company_names = journal.pending(company_names)
+            if total is not None:
+                total = max(total - sum(journal.completed.values()), 0)
+        else:
+            if args.resume:
+                print(f"\n{msg('no_checkpoint')}")
+            exporter = EXPORTERS[args.format](output_dir=args.output_dir, on_flush=journal.commit).open()
+            journal.start(exporter, search_mode, args.format)
+    
+    found_any = False
+    completed = False
+    searched = 0
+    cache = QueryCache(args.cache_path, args.cache_ttl, args.cache_size) if args.cache else None
+    sync_store = None
+    renderer = RENDERERS['silent' if args.no_console else args.console](console)
+    
+    try:
+        # Search for each company name (concurrently if requested, but
+        # results always come back in input order)
+        if args.snapshot:
+            # One Bulk API export, then match every name locally
+            try:
+                snapshot = AccountSnapshot.download(client, args.snapshot_dir)
+            except SalesforceAPIError as e:
+                print(f"Bulk API error: {e.status_code}")
+                print(e.text)
+                return EXIT_ERROR
+            searches = snapshot.search_all(company_names, search_mode)
+        else:
+            name_index = None
+            if args.backend == 'index':
+                # Build the index on first use, afterwards only pull changes
+                name_index = AccountNameIndex(args.name_index)
+                print(f"\nUpdating account name index ({len(name_index)} accounts)...")
+                try:
+                    changed = name_index.refresh(client)
+                except SalesforceAPIError as e:
+                    print(f"API call error: {e.status_code}")
+                    print(e.text)
+                    return EXIT_ERROR
+                print(f"Account name index updated: {changed} new or changed accounts")
+                
+                if args.fuzzy and search_mode == "partial":
+                    search_mode = "fuzzy"
+            
+            # Failed names are journaled for --resume; a --sync run can't be
+            # resumed, its failed lookups keep the store from being committed
+            def search(names):
+                return search_companies(
+                    client, names, search_mode, args.concurrency, cache,
+                    composite=args.composite, name_index=name_index,
+                    backend=args.backend, compare_backends=args.compare_backends,
+                    report_failures=journal is not None and not args.sync
+                )
             
-            # Split comma-separated company names and remove whitespace
-            company_names = [name.strip() for name in company_names_input.split(',') if name.strip()]
+            if args.sync:
+                # Refresh the stored export, then replay it from the store
+                sync_store = SyncStore(args.sync_store)
+                try:
+                    sync_store.update(client, company_names, search_mode, search)
+                except SalesforceAPIError as e:
+                    print(f"API call error: {e.status_code}")
+                    print(e.text)
+                    return EXIT_ERROR
+                searches = sync_store.search_all(company_names)
+            else:
+                searches = search(company_names)
         
-        elif input_method == "2":
-            # Load from CSV file
-            print(f"\n{msg('enter_csv_path')}")
-            csv_path = input(f"{msg('file_path_prompt')}: ").strip()
+        renderer.start(total)
+        lap = time.perf_counter()
+        for company_name, results, contacts_by_account in searches:
+            # Waiting for the search covers its API calls and JSON decoding
+            lap = run_metrics.lap('search', lap)
             
-            # Remove quotes from path (in case user copy-pasted with quotes)
-            csv_path = csv_path.strip('"\'')
+            if results is None:
+                # A failed lookup: nothing is exported, --resume retries it
+                journal.fail(company_name)
+                continue
             
-            if not os.path.exists(csv_path):
-                print(f"{msg('file_not_found')}: {csv_path}")
-                return
+            # Build the rows once; the renderer only decides what to show
+            company_data = build_company_rows(results, company_name, contacts_by_account)
+            lap = run_metrics.lap('rows', lap)
+            renderer.render(company_name, results, contacts_by_account, company_data)
+            startup_timing.mark('first result')
+            lap = run_metrics.lap('display', lap)
+            found_any = found_any or bool(results)
+            searched += 1
             
-            company_names = read_company_names_from_csv(csv_path)
+            if exporter:
+                if journal:
+                    journal.record(company_name)
+                exporter.write(company_name, results, company_data)
+                if shard:
+                    shard.record(exporter)
+                lap = run_metrics.lap('export', lap)
         
-        else:
-            print(f"{msg('invalid_selection')}")
-            return
+        completed = True
+    finally:
+        renderer.finish()
+        # Failed names are still pending, so --resume needs the journal and both files
+        finished = completed and not (journal and journal.failures)
         
-        if not company_names:
-            print(f"{msg('no_valid_names')}")
-            return
+        # Keep whatever was written so far, even if the run is interrupted
+        if exporter:
+            lap = time.perf_counter()
+            if shard and completed:
+                shard.finish(exporter)
+            # A shard keeps its contacts file even if empty; the merge reads every shard
+            exporter.close(discard_empty_contacts=finished and shard is None)
+            run_metrics.lap('export', lap)
+        if journal:
+            journal.close(finished=finished)
+        if cache:
+            print(f"\n{cache.summary()}")
+            cache.close()
+        if sync_store:
+            # Only a finished run without failed lookups becomes the baseline for the next one
+            if completed and not lookup_failures.count:
+                if export:
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    sync_store.write_changes(os.path.join(args.output_dir, f"salesforce_changes_{timestamp}.csv"))
+                sync_store.commit()
+            sync_store.close()
         
-        # Lists to store search results and company data
-        all_results = []
-        all_company_data = []
+        latency_summary = backend_latency.summary()
+        if latency_summary:
+            print(f"\nLookup latency by backend:\n{latency_summary}")
         
-        # Search for each company name
-        for company_name in company_names:
-            print(f"\n{msg('searching_for')} \"{company_name}\"...")
-            exists, results = search_company(auth_info, company_name, search_mode_value)
-            
-            # Display results and get company data
-            company_data = display_results(auth_info, results, company_name)
-            all_company_data.extend(company_data)
-            
-            # Store search results
-            all_results.append((company_name, results))
+        print(f"\n{api_scheduler.summary(searched)}")
+        print(f"\n{run_metrics.summary()}")
+    
+    if not found_any:
+        print(f"\n{msg('no_results')}")
+    if lookup_failures.count:
+        print(f"\n{msg('lookups_failed')}: {lookup_failures.count}")
+        print(msg('retry_failed') if journal and journal.failures else msg('failed_not_found'))
+        return EXIT_ERROR
+    return EXIT_OK
+
+def main(argv=None):
+    """Main function; returns the process exit code"""
+    startup_timing.mark('imports')
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    startup_timing.mark('arguments')
+    
+    if args.console == 'jsonl' and not args.no_console:
+        # stdout only carries the JSON rows so it can be piped as is;
+        # everything else the run prints goes to stderr
+        console = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            return run_command(args, argv, console)
+    return run_command(args, argv)
+
+def run_command(args, argv, console=None):
+    """Merge, start workers or run the tool; returns the process exit code"""
+    # Merging and starting workers need no login of their own
+    if args.merge_shards is not None:
+        return run_merge(args.merge_shards)
+    if args.workers > 1:
+        return run_workers(args, argv)
+    
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    
+    try:
+        return run_tool(args, console)
+    finally:
+        if args.timing:
+            startup_timing.mark('finished')
+            print(f"\n{startup_timing.summary()}")
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"\nProfile written to {args.profile} (view with: python -m pstats {args.profile})")
+        if args.metrics_file:
+            run_metrics.write(args.metrics_file)
+            print(f"Metrics written to {args.metrics_file}")
+
+def run_merge(directory):
+    """Merge finished shard files; returns the process exit code"""
+    try:
+        merge_shards(directory)
+    except (OSError, ValueError) as e:
+        print(f"Error merging shards: {e}")
+        return EXIT_INPUT_ERROR
+    return EXIT_OK
+
+def run_workers(args, argv):
+    """Run one worker process per shard, then merge their files; returns the process exit code"""
+    import subprocess
+    
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    
+    # Workers rerun this command on their shard; later options override
+    # earlier ones, and the rate limit is shared out between them
+    worker_argv = list(argv) + ['--workers', '1', '--console', 'silent']
+    if args.max_rate:
+        worker_argv += ['--max-rate', str(args.max_rate / args.workers)]
+    
+    workers = []
+    for shard_index in range(args.workers):
+        stem = shard_file_stem(shard_index, args.workers)
+        command = [sys.executable, os.path.abspath(__file__)] + worker_argv + [
+            '--shard-index', str(shard_index), '--shard-count', str(args.workers)
+        ]
+        if args.metrics_file:
+            root, extension = os.path.splitext(args.metrics_file)
+            command += ['--metrics-file', f"{root}.{stem}{extension}"]
         
-        # Ask to export results to CSV
-        if any(results for _, results in all_results) or len(all_results) > 0:
-            export_choice = input(f"\n{msg('export_to_csv')}: ").strip().lower()
-            if export_choice == 'y':
-                export_to_csv(all_results, all_company_data)
+        log_path = os.path.join(args.output_dir, f"salesforce_{stem}.log")
+        with open(log_path, 'w', encoding='utf-8') as log:
+            workers.append((shard_index, log_path, subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)))
+    print(f"Started {args.workers} worker processes (logs: {os.path.join(args.output_dir, 'salesforce_shard_*.log')})")
+    
+    exit_code = EXIT_OK
+    for shard_index, log_path, process in workers:
+        returncode = process.wait()
+        if returncode == EXIT_OK:
+            print(f"Shard {shard_index} finished")
         else:
-            print(f"\n{msg('no_results')}")
-    else:
+            print(f"Shard {shard_index} failed with exit code {returncode}; see {log_path}")
+            exit_code = exit_code or returncode
+    
+    if exit_code != EXIT_OK:
+        # Finished shards keep their files; rerun the failed ones with
+        # --shard-index/--shard-count and then --merge-shards
+        return exit_code
+    return run_merge(args.output_dir)
+
+def run_tool(args, console=None):
+    """Log in, collect the names and run the search; returns the process exit code"""
+    # Any input on the command line means an unattended run: no prompts
+    batch = args.input is not None or args.names is not None
+    
+    print(msg('title'))
+    print("-" * len(msg('title')))
+    
+    # Load configuration
+    config = load_config(interactive=not batch)
+    startup_timing.mark('config')
+    if not all(config.values()):
+        print(f"{msg('missing_credentials')}")
+        return EXIT_AUTH_FAILED
+    
+    api_scheduler.configure(args.max_rate, args.api_reserve, args.limits_poll)
+    
+    print(f"\n{msg('connecting')}")
+    # One pooled client for every API call; it re-authenticates on its own
+    # if the token expires during a long run
+    token_cache = None if args.no_token_cache else TokenCache(args.token_cache)
+    client = SalesforceClient.login(
+        config, pool_size=args.concurrency, query_batch_size=args.batch_size, token_cache=token_cache
+    )
+    startup_timing.mark('login (cached token)' if client and client.cached_token else 'login')
+    
+    if not client:
         print(f"{msg('auth_failed')}")
+        return EXIT_AUTH_FAILED
+    
+    print(f"{msg('auth_success')}")
+    print(f"{msg('instance_url')}: {client.instance_url}")
+    
+    # Check configured fields against the (cached) describe results
+    field_projection.configure(*load_field_config(args))
+    if not field_projection.is_default:
+        try:
+            unknown_fields = field_projection.validate(client, DescribeCache(args.describe_cache, args.describe_ttl))
+        except SalesforceAPIError as e:
+            print(f"API call error: {e.status_code}")
+            print(e.text)
+            return EXIT_ERROR
+        if unknown_fields:
+            print(f"{msg('unknown_fields')}: {', '.join(unknown_fields)}")
+            return EXIT_USAGE
+    
+    # Choose search mode
+    search_mode = args.mode or ("partial" if batch else prompt_search_mode())
+    if not search_mode:
+        return EXIT_INPUT_ERROR
+    
+    # Get company names
+    if args.input is not None:
+        company_names = load_company_names(args.input, args.column)
+    elif args.names is not None:
+        company_names = split_company_names(args.names)
+    else:
+        company_names = prompt_company_names()
+    
+    if company_names is None:
+        return EXIT_INPUT_ERROR
+    
+    # CSV input is streamed, so peek at it to catch an empty file
+    if not isinstance(company_names, list):
+        first_name = next(company_names, None)
+        company_names = chain([first_name], company_names) if first_name is not None else []
+    if not company_names:
+        print(f"{msg('no_valid_names')}")
+        return EXIT_INPUT_ERROR
+    if args.sync:
+        # A sync run reads the names twice: to update the store, then to output
+        company_names = list(company_names)
+    
+    # Streamed names have no length, so the progress bar's total and ETA
+    # come from a line count; blank and duplicate rows make it an upper bound
+    total = None
+    if args.input is not None and args.console == 'progress' and not args.no_console:
+        total = count_csv_lines(args.input)
+        if total is not None and args.column:
+            total = max(total - 1, 0)
+    
+    # Ask about CSV export up front so rows can be written as each
+    # search finishes instead of holding everything until the end
+    export = True
+    if not batch:
+        export = input(f"\n{msg('export_to_csv')}: ").strip().lower() == 'y'
+    
+    if export and args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    startup_timing.mark('input and prompts')
+    
+    try:
+        return run_search(client, company_names, search_mode, args, export, console, total)
+    except ApiBudgetExhausted as e:
+        # Rows written so far are kept; --resume continues once the budget recovers
+        print(f"\n{e}")
+        return EXIT_API_BUDGET
+    except SearchFailed as e:
+        # Same as above: the failed batch and everything after it stay pending
+        print(f"\n{e}")
+        return EXIT_ERROR
+    except InputFileError as e:
+        print(f"\n{e}")
+        return EXIT_INPUT_ERROR
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(EXIT_INTERRUPTED)